@@ -0,0 +1,127 @@
+"""
+Compares chunking strategies and chunk sizes on retrieval quality against
+the amount of context each search hands to the agent.
+
+The corpus is a synthetic set of factsheet pages laid out the way the
+extraction prompt returns them: headings per fund, prose paragraphs and
+Markdown tables. Every question is a keyword query of the kind the agent
+passes to rag_search_tool and has a known answer string (a manager's name,
+a return, a holding weight); it counts as a hit when the answer is in the
+text search_documents returns.
+
+  recursive   fixed-size character chunks, as before structured chunking
+  structured  chunks follow headings, keep tables whole and carry their
+              section path
+  filtered    structured, with the search restricted to the question's page
+
+Run from the backend directory:
+    python -m benchmarks.bench_chunking --funds 24 --sizes 500,1000,2000,3000 --k 6
+
+Uses stub bag-of-words embeddings, so compare the rows with each other
+rather than reading the hit rates as those of the production model.
+"""
+import argparse
+import os
+import random
+
+from benchmarks.stubs import build_processor
+from rag_pipline.session_store import estimate_tokens
+
+FUND_WORDS = [
+    "Aurora", "Banyan", "Cobalt", "Delta", "Ember", "Falcon", "Granite", "Harbor", "Indigo", "Juniper",
+    "Kestrel", "Lotus", "Meridian", "Nimbus", "Orchid", "Peregrine", "Quartz", "Redwood", "Sapphire",
+    "Tundra", "Umber", "Vertex", "Willow", "Zephyr",
+]
+MANAGERS = ["Asha Rao", "Vikram Shah", "Meera Iyer", "Rohan Das", "Kavya Nair", "Arjun Mehta", "Nisha Gupta", "Kabir Sen"]
+HOLDINGS = ["Infosys", "Reliance", "HDFC Bank", "TCS", "ITC", "Larsen", "Bharti Airtel", "Axis Bank", "Maruti", "Sun Pharma"]
+FILLER = (
+    "The scheme follows the investment mandate described in the scheme information document. "
+    "Investors should consult their financial advisers if in doubt about whether the product is suitable for them. "
+    "Mutual fund investments are subject to market risks; read all scheme related documents carefully. "
+)
+
+
+def fund_section(name, rng):
+    """Returns the Markdown for one fund and the questions it answers."""
+    manager = rng.choice(MANAGERS)
+    one_year = f"{rng.uniform(4, 30):.2f}%"
+    holdings = rng.sample(HOLDINGS, 8)
+    weights = [f"{rng.uniform(1, 9):.2f}%" for _ in holdings]
+    lines = [
+        f"## {name} Fund",
+        "**Investment Objective**",
+        f"{name} Fund aims to generate long-term capital appreciation. {FILLER * 2}",
+        f"The fund is managed by {manager} since 2019. {FILLER}",
+        "**Portfolio Holdings**",
+        "| Holding | Weight |",
+        "| --- | --- |",
+        *(f"| {holding} | {weight} |" for holding, weight in zip(holdings, weights)),
+        "**Performance**",
+        "| Period | Return |",
+        "| --- | --- |",
+        f"| 1 Year | {one_year} |",
+        f"| 3 Years | {rng.uniform(4, 20):.2f}% |",
+        f"| 5 Years | {rng.uniform(4, 20):.2f}% |",
+    ]
+    questions = [
+        (f"{name} Fund manager", manager),
+        (f"{name} Fund performance 1 Year return", one_year),
+        (f"{name} Fund portfolio holdings {holdings[0]} weight", weights[0]),
+    ]
+    return "\n\n".join(lines[:4]) + "\n\n" + "\n".join(lines[4:]), questions
+
+
+def make_corpus(funds, funds_per_page, seed):
+    """Returns `[(page_number, text)]` and `[(question, answer, page_number)]`."""
+    rng = random.Random(seed)
+    pages, questions = [], []
+    for start in range(0, funds, funds_per_page):
+        page_number = len(pages) + 1
+        sections = [f"# Monthly Factsheet page {page_number}"]
+        for index in range(start, min(start + funds_per_page, funds)):
+            name = FUND_WORDS[index % len(FUND_WORDS)] + ("" if index < len(FUND_WORDS) else f" {index // len(FUND_WORDS) + 1}")
+            section, section_questions = fund_section(name, rng)
+            sections.append(section)
+            questions.extend((question, answer, page_number) for question, answer in section_questions)
+        pages.append((page_number, "\n\n".join(sections)))
+    return pages, questions
+
+
+def run(strategy, chunk_size, pages, questions, k, filtered=False):
+    os.environ["CHUNKING_STRATEGY"] = strategy
+    os.environ["CHUNK_SIZE"] = str(chunk_size)
+    processor = build_processor()
+    for page_number, text in pages:
+        processor.add_documents(text, "Monthly factsheet", {"filename": "factsheet.pdf", "page": page_number})
+    chunks = processor.client.count(processor.collection_name).count
+    hits, tokens = 0, 0
+    for question, answer, page_number in questions:
+        filters = {"filename": "factsheet.pdf", "page": page_number} if filtered else None
+        context = processor.search_documents(question, k=k, mode="dense", filters=filters)
+        hits += answer in context
+        tokens += estimate_tokens(context)
+    return chunks, hits / len(questions), tokens / len(questions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--funds", type=int, default=24)
+    parser.add_argument("--funds-per-page", type=int, default=3)
+    parser.add_argument("--sizes", default="500,1000,2000,3000", help="Comma-separated chunk sizes, in characters.")
+    parser.add_argument("--k", type=int, default=6, help="Chunks returned per search, as rag_search_tool uses.")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    pages, questions = make_corpus(args.funds, args.funds_per_page, args.seed)
+    print(f"{len(pages)} pages, {len(questions)} questions, k={args.k}")
+    print(f"{'strategy':>10} {'chunk size':>11} {'chunks':>7} {'hit rate':>9} {'tokens/query':>13} {'tokens/hit':>11}")
+    for chunk_size in (int(size) for size in args.sizes.split(",")):
+        for strategy, filtered in (("recursive", False), ("structured", False), ("structured", True)):
+            chunks, hit_rate, tokens = run(strategy, chunk_size, pages, questions, args.k, filtered)
+            label = "filtered" if filtered else strategy
+            per_hit = f"{tokens / hit_rate:.0f}" if hit_rate else "-"
+            print(f"{label:>10} {chunk_size:>11} {chunks:>7} {hit_rate:>9.0%} {tokens:>13.0f} {per_hit:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""
+End-to-end benchmark of the FastAPI app with every remote service replaced
+by a local stand-in: StubModel for Gemini vision, StubEmbeddings for the
+embedding model, in-memory Qdrant, StubChatModel for the agent and a canned
+Tavily responder.
+
+It uploads PDFs through /upload (polling the ingestion job to completion)
+and then sends questions to /chat, both under configurable concurrency, and
+reports p50/p95/p99 latency, throughput and peak RSS for each endpoint and
+for each pipeline stage:
+
+  triage        per-page assessment of the text layer (PageTriage.assess)
+  text_extract  reading a text-path page from its text layer
+  render        rasterizing a vision-path page
+  extract       the (stub) vision model call
+  split, embed, upsert, search, agent
+
+Pages go through triage as in production, so the stages recorded depend on
+--triage-policy: the synthetic pages are text dominant, so with "auto" they
+take the text path and render/extract stay empty; "vision" sends every page
+through rendering and the vision model.
+
+Run from the backend directory:
+    python -m benchmarks.bench_end_to_end --uploads 4 --pages 10 --chats 50 --concurrency 8 --output results.json
+    python -m benchmarks.bench_end_to_end --triage-policy vision
+"""
+import argparse
+import asyncio
+import functools
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+from benchmarks.bench_rasterization import make_pdf
+from benchmarks.stubs import (
+    AsyncStubTavilyClient,
+    StubChatModel,
+    StubTavilyClient,
+    build_processor,
+)
+from pipeline_for_docement_ingestion.pageTriage import PageTriage
+
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class StageRecorder:
+    """Collects per-call durations and the RSS observed at the end of each call, by stage."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.durations = {}
+        self.peak_rss = {}
+
+    def record(self, stage, seconds):
+        rss = current_rss_mb()
+        with self.lock:
+            self.durations.setdefault(stage, []).append(seconds)
+            self.peak_rss[stage] = max(self.peak_rss.get(stage, 0.0), rss)
+
+    def wrap(self, stage, fn):
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return timed
+
+    def wrap_async(self, stage, fn):
+        @functools.wraps(fn)
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return timed
+
+    def wrap_generator(self, stage, fn):
+        """Times each item a generator yields, i.e. the work done to produce it."""
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            iterator = iter(fn(*args, **kwargs))
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                self.record(stage, time.perf_counter() - start)
+                yield item
+        return timed
+
+    def summary(self):
+        result = {}
+        with self.lock:
+            for stage, durations in self.durations.items():
+                result[stage] = summarize(durations)
+                result[stage]["peak_rss_mb"] = self.peak_rss[stage]
+        return result
+
+
+def summarize(durations, wall_seconds=None):
+    values = sorted(durations)
+    summary = {
+        "count": len(values),
+        "mean_ms": sum(values) / len(values) * 1000 if values else None,
+        "p50_ms": percentile(values, 0.50) * 1000 if values else None,
+        "p95_ms": percentile(values, 0.95) * 1000 if values else None,
+        "p99_ms": percentile(values, 0.99) * 1000 if values else None,
+    }
+    if wall_seconds:
+        summary["throughput_per_s"] = len(values) / wall_seconds
+    return summary
+
+
+def install_stubs(args, recorder):
+    """Points the shared resources at the stand-ins and instruments every stage."""
+    os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+    os.environ["STARTUP_WARMUP"] = "false"
+    os.environ.setdefault("INGESTION_JOBS_PATH", os.path.join(tempfile.mkdtemp(), "ingestion_jobs.sqlite3"))
+
+    from resources import resources
+
+    processor = build_processor(latency=args.extract_latency, in_flight=args.in_flight, embedding_latency=args.embedding_latency)
+    processor.page_triage = PageTriage(policy=args.triage_policy)
+    processor.page_triage.assess = recorder.wrap("triage", processor.page_triage.assess)
+    processor.page_triage.extract_text = recorder.wrap("text_extract", processor.page_triage.extract_text)
+    processor._render_page = recorder.wrap("render", processor._render_page)
+    processor.generate_content = recorder.wrap("extract", processor.generate_content)
+    processor.split_documents = recorder.wrap("split", processor.split_documents)
+    processor.search_documents = recorder.wrap("search", processor.search_documents)
+    embeddings = processor.embeddings
+    embeddings.embed_documents = recorder.wrap("embed", embeddings.embed_documents)
+    embeddings.embed_query = recorder.wrap("embed", embeddings.embed_query)
+    processor.client.upsert = recorder.wrap("upsert", processor.client.upsert)
+
+    resources._doc_processor = processor
+    resources._tavily_client = StubTavilyClient(latency=args.web_latency)
+    resources._async_tavily_client = AsyncStubTavilyClient(latency=args.web_latency)
+    return processor
+
+
+async def run_uploads(client, pdf_bytes, args):
+    semaphore = asyncio.Semaphore(args.concurrency)
+    accept_latencies, ingestion_latencies = [], []
+
+    async def upload(index):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post("/upload", files={"file": (f"bench-{index}.pdf", pdf_bytes, "application/pdf")})
+            response.raise_for_status()
+            accept_latencies.append(time.perf_counter() - start)
+            job_id = response.json()["job_id"]
+            while True:
+                job = (await client.get(f"/jobs/{job_id}")).json()
+                if job["status"] not in ("queued", "running"):
+                    break
+                await asyncio.sleep(0.02)
+            if job["status"] != "completed":
+                raise RuntimeError(f"Ingestion job {job_id} ended as {job['status']}")
+            ingestion_latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(upload(index) for index in range(args.uploads)))
+    return accept_latencies, ingestion_latencies, time.perf_counter() - start
+
+
+async def run_chats(client, args):
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+
+    async def chat(index):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post("/chat", json={"question": f"What is the expense ratio of fund {index % 10}?"})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(chat(index) for index in range(args.chats)))
+    return latencies, time.perf_counter() - start
+
+
+async def run(args):
+    recorder = StageRecorder()
+    install_stubs(args, recorder)
+
+    import main
+    from rag_pipline.google_agent import GoogleAgent
+    from rag_pipline.router import RetrievalRouter
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, "bench.pdf")
+        make_pdf(pdf_path, args.pages)
+        with open(pdf_path, "rb") as f:
+            pdf_bytes = f.read()
+
+    async with main.app.router.lifespan_context(main.app):
+        main.google_agent = GoogleAgent(
+            model=StubChatModel(latency=args.agent_latency, use_web=args.use_web),
+            answer_cache=None if args.answer_cache else False,
+            orchestration=args.orchestration,
+            # The router searches the web exactly when the scripted agent would.
+            router=RetrievalRouter(policy="always" if args.use_web else "never"),
+        )
+        main.google_agent.aquery = recorder.wrap_async("agent", main.google_agent.aquery)
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            accept, ingestion, upload_wall = await run_uploads(client, pdf_bytes, args)
+            upload_rss = current_rss_mb()
+            chats, chat_wall = await run_chats(client, args)
+            chat_rss = current_rss_mb()
+
+    return {
+        "config": vars(args),
+        "endpoints": {
+            "upload_accept": {**summarize(accept, upload_wall), "peak_rss_mb": upload_rss},
+            "upload_ingestion": {**summarize(ingestion, upload_wall), "peak_rss_mb": upload_rss},
+            "chat": {**summarize(chats, chat_wall), "peak_rss_mb": chat_rss},
+        },
+        "stages": recorder.summary(),
+    }
+
+
+def print_table(results, stream):
+    print(f"{'name':>18} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'per s':>8} {'RSS MB':>8}", file=stream)
+    rows = list(results["endpoints"].items()) + list(results["stages"].items())
+    for name, row in rows:
+        throughput = row.get("throughput_per_s")
+        print(
+            f"{name:>18} {row['count']:>6} {row['p50_ms'] or 0:>9.1f} {row['p95_ms'] or 0:>9.1f} {row['p99_ms'] or 0:>9.1f} "
+            f"{throughput if throughput is not None else float('nan'):>8.2f} {row['peak_rss_mb']:>8.1f}",
+            file=stream,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uploads", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--in-flight", type=int, default=4, help="GEMINI_MAX_IN_FLIGHT for the stub vision model.")
+    parser.add_argument("--triage-policy", choices=["auto", "vision", "text"], default="auto", help="TRIAGE_POLICY for the uploads.")
+    parser.add_argument("--extract-latency", type=float, default=0.2)
+    parser.add_argument("--embedding-latency", type=float, default=0.02)
+    parser.add_argument("--agent-latency", type=float, default=0.3, help="Latency of each agent model turn.")
+    parser.add_argument("--web-latency", type=float, default=0.5)
+    parser.add_argument("--use-web", action="store_true", help="Make the stub agent call web_search_tool as well.")
+    parser.add_argument("--orchestration", choices=["agent", "router"], default="agent", help="ORCHESTRATION_MODE of the agent.")
+    parser.add_argument("--no-answer-cache", dest="answer_cache", action="store_false", help="Run the agent for every /chat request.")
+    parser.add_argument("--output", help="Write the JSON results here instead of stdout.")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print_table(results, sys.stderr)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
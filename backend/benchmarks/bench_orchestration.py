@@ -0,0 +1,120 @@
+"""
+Compares the two ways GoogleAgent answers a question, with the chat model and
+Tavily replaced by stand-ins that sleep for a configurable latency.
+
+  agent   the model calls rag_search_tool, then (for web questions)
+          web_search_tool, then answers: one model round-trip per step
+  router  the local router decides on web search up front, RAG and web
+          search run concurrently, and one model call writes the answer
+
+Two question sets are run: questions the ingested factsheets answer, and
+questions asking for the latest news, which need the web as well. A third
+run makes Tavily slower than WEB_SEARCH_TIMEOUT to show the web leg being
+dropped instead of stalling the answer.
+
+Run from the backend directory:
+    python -m benchmarks.bench_orchestration --questions 20 --model-latency 1.0 --web-latency 1.5
+
+Reports mean latency, model calls and web searches per question, and how
+the router classified the questions.
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.bench_chunking import make_corpus
+from benchmarks.stubs import AsyncStubTavilyClient, StubChatModel, StubTavilyClient, build_processor
+
+WEB_QUESTIONS = [
+    "latest news on {fund} Fund",
+    "{fund} Fund NAV announced today",
+    "current share price of Bajaj Finserv and {fund} Fund",
+    "{fund} Fund news this week",
+]
+
+
+async def run(mode, questions, use_web, args, web_latency=None):
+    from resources import resources
+    from rag_pipline.google_agent import GoogleAgent
+    from rag_pipline.router import RetrievalRouter
+
+    tavily = AsyncStubTavilyClient(latency=args.web_latency if web_latency is None else web_latency)
+    resources._async_tavily_client = tavily
+    model = StubChatModel(latency=args.model_latency, use_web=use_web)
+    agent = GoogleAgent(
+        model=model,
+        answer_cache=False,
+        orchestration=mode,
+        router=RetrievalRouter(min_similarity=args.min_similarity),
+        web_timeout=args.web_timeout,
+    )
+    routes = {}
+    start = time.perf_counter()
+    for question in questions:
+        response = await agent.aquery(question)
+        route = response.get("route")
+        if route:
+            routes[route["reason"]] = routes.get(route["reason"], 0) + 1
+    elapsed = time.perf_counter() - start
+    return {
+        "seconds": elapsed / len(questions),
+        "model_calls": model.stats["calls"] / len(questions),
+        "web_calls": tavily.calls / len(questions),
+        "routes": routes,
+    }
+
+
+async def benchmark(args):
+    from resources import resources
+
+    processor = build_processor(embedding_latency=args.embedding_latency)
+    pages, corpus_questions = make_corpus(args.funds, 3, seed=7)
+    for page_number, text in pages:
+        processor.add_documents(text, "Monthly factsheet", {"filename": "factsheet.pdf", "page": page_number})
+    resources._doc_processor = processor
+    resources._tavily_client = StubTavilyClient()
+
+    internal = [question for question, _, _ in corpus_questions][:args.questions]
+    funds = [question.split(" Fund", 1)[0] for question in internal]
+    web = [WEB_QUESTIONS[index % len(WEB_QUESTIONS)].format(fund=fund) for index, fund in enumerate(funds)]
+
+    print(f"{'questions':>10} {'mode':>7} {'s/question':>11} {'model calls':>12} {'web calls':>10}  routes")
+    scenarios = [
+        ("internal", internal, False, None),
+        ("web", web, True, None),
+        ("slow web", web, True, args.web_timeout * 3),
+    ]
+    for label, questions, use_web, web_latency in scenarios:
+        baseline = None
+        for mode in ("agent", "router"):
+            result = await run(mode, questions, use_web, args, web_latency)
+            print(
+                f"{label:>10} {mode:>7} {result['seconds']:>11.2f} {result['model_calls']:>12.1f} "
+                f"{result['web_calls']:>10.1f}  {result['routes'] or ''}"
+            )
+            if baseline is None:
+                baseline = result["seconds"]
+            else:
+                print(f"{'':>10} router saves {baseline - result['seconds']:.2f}s per question ({1 - result['seconds'] / baseline:.0%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--funds", type=int, default=24)
+    parser.add_argument("--model-latency", type=float, default=1.0, help="Seconds per chat model call.")
+    parser.add_argument("--web-latency", type=float, default=1.5, help="Seconds per Tavily search.")
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    parser.add_argument("--web-timeout", type=float, default=2.0, help="WEB_SEARCH_TIMEOUT for router mode.")
+    parser.add_argument(
+        "--min-similarity", type=float, default=0.3,
+        help="ROUTER_MIN_SIMILARITY; the stub bag-of-words embedder scores lower than Gemini embeddings.",
+    )
+    args = parser.parse_args()
+    os.environ.setdefault("CHUNKING_STRATEGY", "structured")
+    asyncio.run(benchmark(args))
+
+
+if __name__ == "__main__":
+    main()
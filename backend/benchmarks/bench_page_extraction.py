@@ -0,0 +1,39 @@
+"""
+Measures page-extraction throughput as the worker pool grows.
+
+Gemini is replaced by a stub with a fixed latency and Qdrant runs in memory,
+so the numbers reflect the pipeline's own concurrency rather than the network.
+
+Run from the backend directory:
+    python -m benchmarks.bench_page_extraction --pages 40 --latency 0.5 --workers 1 2 4 8
+"""
+import argparse
+import time
+
+from PIL import Image
+
+from benchmarks.stubs import build_processor
+from pipeline_for_docement_ingestion.pageExtractor import PageExtractor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.5, help="Simulated Gemini latency per page, in seconds.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    images = [Image.new("RGB", (595, 842), "white") for _ in range(args.pages)]
+    print(f"{'workers':>8} {'seconds':>10} {'pages/sec':>10}")
+    for workers in args.workers:
+        processor = build_processor(args.latency, in_flight=workers)
+        extractor = PageExtractor(processor, max_workers=workers)
+        start = time.perf_counter()
+        results = extractor.process_images(images)
+        elapsed = time.perf_counter() - start
+        assert len(results) == len(images)
+        print(f"{workers:>8} {elapsed:>10.2f} {len(images) / elapsed:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
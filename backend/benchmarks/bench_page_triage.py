@@ -0,0 +1,102 @@
+"""
+Compares ingestion with and without page triage on a synthetic factsheet mix
+of text pages, table pages, chart pages and scanned (image-only) pages.
+
+  vision  every page is rendered and sent to the (stub) vision model
+  auto    text-dominant pages are read from the text layer; only the chart
+          and scanned pages reach the model
+
+Reports model calls, wall time and which path each kind of page took.
+
+Run from the backend directory:
+    python -m benchmarks.bench_page_triage --pages 40 --latency 2.0 --chart-every 5 --scan-every 7
+
+The time saved grows with model latency: triage itself costs tens of
+milliseconds per page, a Gemini vision call typically a few seconds.
+"""
+import argparse
+import time
+from io import BytesIO
+
+import fitz
+from PIL import Image, ImageDraw
+
+from benchmarks.stubs import build_processor
+from pipeline_for_docement_ingestion.pageExtractor import PageExtractor
+from pipeline_for_docement_ingestion.pageTriage import PageTriage, triage_report
+
+
+def scanned_page_image(page_number):
+    image = Image.new("RGB", (1240, 1754), "white")
+    draw = ImageDraw.Draw(image)
+    for row in range(40):
+        draw.text((100, 100 + row * 38), f"Scanned statement page {page_number} line {row}: units 1,{row:03d}.45", fill="black")
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def make_mixed_pdf(pages, chart_every, scan_every):
+    doc = fitz.open()
+    for page_number in range(1, pages + 1):
+        page = doc.new_page()
+        if scan_every and page_number % scan_every == 0:
+            page.insert_image(page.rect, stream=scanned_page_image(page_number))
+            continue
+        page.insert_text((72, 72), f"Fund factsheet page {page_number}", fontsize=18)
+        for row in range(12):
+            page.insert_text((72, 110 + row * 18), f"Scheme {row:02d} returned {row * 1.7:.2f}% over one year; NAV {100 + row * 3.1:.2f}.")
+        if chart_every and page_number % chart_every == 0:
+            # A bar chart: many filled shapes covering most of the lower half of the page.
+            for bar in range(24):
+                height = 40 + (bar * 37) % 260
+                page.draw_rect(fitz.Rect(72 + bar * 19, 760 - height, 86 + bar * 19, 760), color=(0, 0, 0.5), fill=(0.3, 0.5, 0.9))
+            page.draw_rect(fitz.Rect(60, 380, 540, 770), color=(0, 0, 0), fill=(0.95, 0.95, 0.95), overlay=False)
+        else:
+            for row in range(6):
+                for column in range(4):
+                    cell = fitz.Rect(72 + column * 110, 400 + row * 22, 182 + column * 110, 422 + row * 22)
+                    page.draw_rect(cell, color=(0, 0, 0))
+                    page.insert_text((cell.x0 + 4, cell.y1 - 6), f"R{row}C{column} {row * column * 0.35:.2f}", fontsize=9)
+    file_content = doc.tobytes()
+    doc.close()
+    return file_content
+
+
+def run(policy, file_content, latency, workers):
+    processor = build_processor(latency, in_flight=workers)
+    processor.page_triage = PageTriage(policy=policy)
+    extractor = PageExtractor(processor, max_workers=workers)
+    start = time.perf_counter()
+    results = extractor.process_pages(processor.triage_pdf(file_content), filename="bench.pdf")
+    elapsed = time.perf_counter() - start
+    return elapsed, processor.model.calls, triage_report(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=2.0, help="Simulated Gemini latency per page, in seconds.")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--chart-every", type=int, default=5, help="Every Nth page carries a bar chart.")
+    parser.add_argument("--scan-every", type=int, default=7, help="Every Nth page is a scanned image without a text layer.")
+    args = parser.parse_args()
+
+    file_content = make_mixed_pdf(args.pages, args.chart_every, args.scan_every)
+    print(f"{'policy':>8} {'seconds':>10} {'model calls':>12} {'text pages':>11} {'vision pages':>13}")
+    baseline = None
+    for policy in ("vision", "auto"):
+        elapsed, calls, report = run(policy, file_content, args.latency, args.workers)
+        print(f"{policy:>8} {elapsed:>10.2f} {calls:>12} {report['text_pages']:>11} {report['vision_pages']:>13}")
+        if baseline is None:
+            baseline = (elapsed, calls)
+        else:
+            print(f"auto vs vision: {1 - elapsed / baseline[0]:.0%} less time, {1 - calls / baseline[1]:.0%} fewer model calls")
+            reasons = {}
+            for page in report["details"]:
+                reasons[page["reason"]] = reasons.get(page["reason"], 0) + 1
+            print(f"triage reasons: {reasons}")
+
+
+if __name__ == "__main__":
+    main()
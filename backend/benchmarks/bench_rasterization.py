@@ -0,0 +1,87 @@
+"""
+Compares peak memory and latency of the two PDF rasterization paths:
+
+  list    convert_pdf_to_images -> slice to pages_to_process -> PNG via PIL/BytesIO
+  stream  rasterize_pdf(max_pages=...) yielding pix.tobytes() one page at a time
+
+Each mode runs in its own subprocess so peak RSS is not shared between them.
+
+Run from the backend directory:
+    python -m benchmarks.bench_rasterization --pages 100 --pages-to-process 10 --dpi 150
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+import fitz
+
+from benchmarks.stubs import build_processor
+
+
+def make_pdf(path, pages):
+    doc = fitz.open()
+    for page_number in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Synthetic factsheet page {page_number + 1}", fontsize=18)
+        for row in range(30):
+            page.insert_text((72, 110 + row * 20), f"Scheme {row:02d}   NAV {100 + row * 1.37:.2f}   Expense ratio {0.5 + row / 100:.2f}%")
+        page.draw_rect(fitz.Rect(320, 600, 540, 780), color=(0, 0, 1), fill=(0.6, 0.8, 1))
+    doc.save(path)
+
+
+def run_mode(mode, pdf_path, pages_to_process, dpi):
+    processor = build_processor()
+    with open(pdf_path, "rb") as f:
+        file_content = f.read()
+    start = time.perf_counter()
+    encoded_bytes = 0
+    if mode == "list":
+        images = processor.convert_pdf_to_images(file_content)
+        if pages_to_process is not None:
+            images = images[:pages_to_process]
+        for image in images:
+            buffer = BytesIO()
+            image.save(buffer, format="PNG")
+            encoded_bytes += len(buffer.getvalue())
+    else:
+        for page_bytes in processor.rasterize_pdf(file_content, max_pages=pages_to_process, dpi=dpi):
+            encoded_bytes += len(page_bytes)
+    elapsed = time.perf_counter() - start
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({"mode": mode, "seconds": elapsed, "peak_rss_mb": peak_rss_mb, "encoded_bytes": encoded_bytes}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--pages-to-process", type=int, default=None)
+    parser.add_argument("--dpi", type=int, default=72, help="DPI for the streaming path; the list path always renders at 72.")
+    parser.add_argument("--run-mode", choices=["list", "stream"], help=argparse.SUPPRESS)
+    parser.add_argument("--pdf", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_mode:
+        run_mode(args.run_mode, args.pdf, args.pages_to_process, args.dpi)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, "bench.pdf")
+        make_pdf(pdf_path, args.pages)
+        print(f"{'mode':>8} {'seconds':>10} {'peak RSS MB':>12}")
+        for mode in ["list", "stream"]:
+            command = [sys.executable, "-m", "benchmarks.bench_rasterization", "--run-mode", mode, "--pdf", pdf_path, "--pages", str(args.pages), "--dpi", str(args.dpi)]
+            if args.pages_to_process is not None:
+                command += ["--pages-to-process", str(args.pages_to_process)]
+            output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{mode:>8} {result['seconds']:>10.2f} {result['peak_rss_mb']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
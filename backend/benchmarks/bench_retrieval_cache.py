@@ -0,0 +1,80 @@
+"""
+Replays a query log against search_documents with the retrieval cache off,
+with exact matching only, and with near-duplicate matching enabled.
+
+Embedding calls are simulated with a fixed latency and Qdrant runs in memory,
+so the difference between modes is the remote work the cache avoids.
+
+Run from the backend directory:
+    python -m benchmarks.bench_retrieval_cache --queries 500 --embedding-latency 0.05
+    python -m benchmarks.bench_retrieval_cache --log queries.txt   # one query per line
+"""
+import argparse
+import random
+import time
+
+from benchmarks.stubs import build_processor
+from pipeline_for_docement_ingestion.retrievalCache import RetrievalCache
+
+FUNDS = ["Bajaj Finserv Flexi Cap Fund", "Bajaj Finserv Liquid Fund", "Bajaj Finserv Large Cap Fund",
+         "Bajaj Finserv Arbitrage Fund", "Bajaj Finserv Balanced Advantage Fund", "Bajaj Finserv Overnight Fund"]
+TEMPLATES = ["What is the expense ratio of {fund}?", "Who is the fund manager of {fund}?",
+             "What is the AUM of {fund}", "What is the benchmark index for {fund}?",
+             "Show the top holdings of {fund}", "What is the exit load of {fund}?"]
+VARIANTS = [lambda q: q, lambda q: q.lower(), lambda q: q.rstrip("?") + " ?", lambda q: "Please tell me " + q[0].lower() + q[1:]]
+
+
+def synthetic_log(count, seed=7):
+    rng = random.Random(seed)
+    questions = [template.format(fund=fund) for fund in FUNDS for template in TEMPLATES]
+    # Zipf-like popularity: a few canned questions dominate, as in production traffic.
+    weights = [1 / (rank + 1) for rank in range(len(questions))]
+    return [rng.choice(VARIANTS)(rng.choices(questions, weights)[0]) for _ in range(count)]
+
+
+def seed_corpus(processor):
+    for fund in FUNDS:
+        for page, topic in enumerate(["expense ratio 0.65% and exit load 1%", "fund manager and benchmark index",
+                                      "AUM of Rs 4,215 crore and top holdings"], start=1):
+            processor.add_documents(f"{fund} factsheet. {topic}. " * 20, f"{fund} factsheet", {"filename": "factsheet.pdf", "page": page})
+
+
+def replay(processor, queries):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        processor.search_documents(query)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return sum(latencies) / len(latencies), latencies[int(len(latencies) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--log", help="File with one query per line; a synthetic log is used if omitted.")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    parser.add_argument("--similarity", type=float, default=0.9)
+    args = parser.parse_args()
+
+    if args.log:
+        with open(args.log) as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        queries = synthetic_log(args.queries)
+
+    modes = [("off", False), ("exact", RetrievalCache(similarity_threshold=0)),
+             ("similar", RetrievalCache(similarity_threshold=args.similarity))]
+    print(f"{'mode':>8} {'mean ms':>9} {'p95 ms':>9} {'embed calls':>12} {'hit rate':>9}")
+    for name, cache in modes:
+        processor = build_processor(retrieval_cache=cache, embedding_latency=args.embedding_latency)
+        seed_corpus(processor)
+        embed_calls_before = processor.embeddings.calls
+        mean, p95 = replay(processor, queries)
+        embed_calls = processor.embeddings.calls - embed_calls_before
+        hit_rate = cache.stats()["hit_rate"] if cache else 0.0
+        print(f"{name:>8} {mean * 1000:>9.1f} {p95 * 1000:>9.1f} {embed_calls:>12} {hit_rate:>9.2%}")
+
+
+if __name__ == "__main__":
+    main()
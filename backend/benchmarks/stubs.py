@@ -0,0 +1,166 @@
+"""Local stand-ins for the remote services the backend depends on."""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import Field
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, VectorParams
+
+from pipeline_for_docement_ingestion.docsProcessing import DocsProcessor
+from pipeline_for_docement_ingestion.sparseIndex import SparseIndex
+
+EMBEDDING_SIZE = 768
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    """Stands in for genai.GenerativeModel, sleeping to simulate the vision call."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+
+    def generate_content(self, parts):
+        self.calls += 1
+        time.sleep(self.latency)
+        # Vary the text with the page so different pages produce different chunks.
+        page_ref = hashlib.md5(parts[-1]["data"]).hexdigest()[:8]
+        return StubResponse(json.dumps({"text": f"Fund factsheet page {page_ref}. " * 50, "summary": "Stub page"}))
+
+
+class StubEmbeddings(Embeddings):
+    """Bag-of-words hashing embedder with a simulated per-call latency."""
+
+    def __init__(self, size=EMBEDDING_SIZE, latency=0.0):
+        self.size = size
+        self.latency = latency
+        self.calls = 0
+
+    def _embed(self, text):
+        vector = np.zeros(self.size, dtype=np.float32)
+        for token in re.findall(r"\w+", text.lower()):
+            bucket = int.from_bytes(hashlib.md5(token.encode()).digest()[:4], "big") % self.size
+            vector[bucket] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        self.calls += 1
+        time.sleep(self.latency)
+        return self._embed(text)
+
+
+class StubChatModel(BaseChatModel):
+    """Calls rag_search_tool, then web_search_tool if `use_web`, then answers; answers at once without tools bound."""
+
+    latency: float = 0.0
+    use_web: bool = False
+    tools_bound: bool = False
+    # Shared with the tool-bound copy, so calls through either are counted.
+    stats: dict = Field(default_factory=lambda: {"calls": 0})
+
+    @property
+    def _llm_type(self):
+        return "stub-chat"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.model_copy(update={"tools_bound": True})
+
+    def _next_message(self, messages):
+        self.stats["calls"] += 1
+        if not self.tools_bound:
+            return self._answer()
+        question = next((m.content for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+        # Like a real model, search for the current query rather than the whole session prompt.
+        question = question.split("**Current user query**:", 1)[-1].split("\n", 1)[0]
+        tools_called = {m.name for m in messages if isinstance(m, ToolMessage)}
+        if "rag_search_tool" not in tools_called:
+            return AIMessage(content="", tool_calls=[{"id": "rag-1", "name": "rag_search_tool", "args": {"query": question}}])
+        if self.use_web and "web_search_tool" not in tools_called:
+            return AIMessage(content="", tool_calls=[{"id": "web-1", "name": "web_search_tool", "args": {"query": question}}])
+        return self._answer()
+
+    @staticmethod
+    def _answer():
+        return AIMessage(
+            content="As per Bajaj Finserv's documentation, here is the answer.",
+            response_metadata={"finish_reason": "STOP"},
+            usage_metadata={"input_tokens": 1200, "output_tokens": 40, "total_tokens": 1240},
+        )
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._next_message(messages))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._next_message(messages))])
+
+
+CANNED_TAVILY_RESPONSE = {
+    "query": "",
+    "follow_up_questions": None,
+    "answer": "Bajaj Finserv Asset Management publishes monthly factsheets for each scheme.",
+    "images": [],
+    "results": [
+        {"url": "https://www.bajajamc.com/", "title": "Bajaj Finserv AMC", "content": "Monthly factsheets and scheme details.", "score": 0.8},
+    ],
+    "response_time": 0.0,
+}
+
+
+class StubTavilyClient:
+    """Canned stand-in for TavilyClient.search."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+
+    def search(self, query, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        return {**CANNED_TAVILY_RESPONSE, "query": query}
+
+
+class AsyncStubTavilyClient(StubTavilyClient):
+    """Canned stand-in for AsyncTavilyClient.search."""
+
+    async def search(self, query, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return {**CANNED_TAVILY_RESPONSE, "query": query}
+
+
+def build_processor(latency=0.0, in_flight=None, extraction_cache=False, retrieval_cache=False, embedding_latency=0.0):
+    """A DocsProcessor on stub models and in-memory Qdrant, with both caches off by default."""
+    if in_flight is not None:
+        os.environ["GEMINI_MAX_IN_FLIGHT"] = str(in_flight)
+    client = QdrantClient(":memory:")
+    collection_name = os.getenv("COLLECTION_NAME", "BAJAJ_FINANCIAL_REPORT_TEST")
+    client.create_collection(collection_name, vectors_config=VectorParams(size=EMBEDDING_SIZE, distance=Distance.COSINE))
+    return DocsProcessor(
+        model=StubModel(latency),
+        embeddings=StubEmbeddings(latency=embedding_latency),
+        client=client,
+        extraction_cache=extraction_cache,
+        retrieval_cache=retrieval_cache,
+        sparse_index=SparseIndex(collection_name, path=":memory:"),
+    )
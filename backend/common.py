@@ -0,0 +1,33 @@
+import os
+import re
+import time
+import sqlite3
+
+
+def normalize_query(query):
+    """The form of a query that the answer, retrieval and session caches key on."""
+    return re.sub(r"\s+", " ", str(query).strip().lower()).rstrip("?.! ")
+
+
+def connect_sqlite(path):
+    """Opens a SQLite database that may be used from several threads, creating its directory first."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return sqlite3.connect(path, check_same_thread=False)
+
+
+class LazyInit:
+    """Creates attributes on first use; subclasses set `_init_lock` (an RLock) and the `init_seconds` dict."""
+
+    def _lazy(self, attribute, factory):
+        value = getattr(self, attribute)
+        if value is None:
+            with self._init_lock:
+                value = getattr(self, attribute)
+                if value is None:
+                    start = time.perf_counter()
+                    value = factory()
+                    setattr(self, attribute, value)
+                    self.init_seconds[attribute.lstrip("_")] = time.perf_counter() - start
+        return value
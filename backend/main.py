@@ -1,16 +1,27 @@
+import time
+_import_started = time.perf_counter()
 import os
+import asyncio
+import logging
 from fastapi import FastAPI, File, UploadFile, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
 import json
+from typing import Optional
 from pydantic import BaseModel
-# from concurrent.futures import ThreadPoolExecutor
-from pipeline_for_docement_ingestion.docsProcessing import DocsProcessor
-from rag_pipline.google_agent import GoogleAgent
+from rag_pipline.google_agent import GoogleAgent, message_text
+from resources import resources
+from pipeline_for_docement_ingestion.pageTriage import triage_report
+from observability import metrics, profile_request, request_id_from, request_id_var, request_spans_var
 from dotenv import load_dotenv
 from langchain_core.messages import BaseMessage
 
 load_dotenv()
 
+# Startup-time breakdown served by /startup/timings.
+startup_timings = {"imports": time.perf_counter() - _import_started, "first_request": None}
+
 app = FastAPI()
 
 # Add CORS middleware
@@ -32,84 +43,188 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-doc_processor = None
 google_agent = None
+warm_up_task = None
 
 @app.on_event("startup")
 async def startup_event():
-    global doc_processor, google_agent
+    global google_agent, warm_up_task
     if not os.getenv("GOOGLE_API_KEY"):
         raise HTTPException(status_code=500, detail="GOOGLE_API_KEY environment variable not set.")
-    doc_processor = DocsProcessor()
     google_agent = GoogleAgent()
+    # Starts the ingestion workers and re-queues jobs a previous run left unfinished.
+    resources.ingestion_jobs.start()
+    # Clients are created lazily; warm them up in the background so the server
+    # accepts traffic immediately instead of waiting on Gemini/Qdrant handshakes.
+    if os.getenv("STARTUP_WARMUP", "true").lower() == "true":
+        warm_up_task = asyncio.create_task(run_in_threadpool(resources.warm_up))
+    logging.info(f"Startup finished; imports took {startup_timings['imports']:.2f}s.")
+
+@app.middleware("http")
+async def record_first_request(request, call_next):
+    if startup_timings["first_request"] is not None:
+        return await call_next(request)
+    start = time.perf_counter()
+    response = await call_next(request)
+    if startup_timings["first_request"] is None:
+        startup_timings["first_request"] = {"path": request.url.path, "seconds": time.perf_counter() - start}
+    return response
+
+@app.middleware("http")
+async def trace_request(request, call_next):
+    """Tags the request with an ID for its spans (a valid X-Request-ID, else a new one), records its latency and logs or profiles it."""
+    request_id = request_id_from(request.headers.get("x-request-id"))
+    id_token = request_id_var.set(request_id)
+    spans_token = request_spans_var.set([])
+    metrics.inc("rag_http_requests_in_flight", 1)
+    start = time.perf_counter()
+    status_code = 500
+    profile_file = None
+    try:
+        if request.headers.get("x-profile", "").lower() == "true":
+            with profile_request(request_id) as profile_file:
+                response = await call_next(request)
+        else:
+            response = await call_next(request)
+        status_code = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        if profile_file is not None:
+            # Only the file name inside PROFILE_DIR; the server's paths are not disclosed.
+            response.headers["X-Profile-File"] = profile_file
+        return response
+    finally:
+        duration = time.perf_counter() - start
+        metrics.inc("rag_http_requests_in_flight", -1)
+        route = request.scope.get("route")
+        metrics.observe(
+            "rag_http_request_duration_seconds",
+            duration,
+            method=request.method,
+            path=route.path if route is not None else "unmatched",
+            status=status_code,
+        )
+        if duration >= float(os.getenv("SLOW_REQUEST_SECONDS", "5")):
+            trace = {"request_id": request_id, "path": request.url.path, "seconds": round(duration, 3), "spans": request_spans_var.get()}
+            logging.warning(f"Slow request {json.dumps(trace, default=str)}")
+        request_spans_var.reset(spans_token)
+        request_id_var.reset(id_token)
 
 @app.get("/")
 async def root():
     return {"message": "Bajaj Finserv RAG Chatbot API is running."}
 
 
+@app.get("/startup/timings")
+async def startup_timing_report():
+    return {
+        "imports_seconds": startup_timings["imports"],
+        "client_init_seconds": resources.init_timings(),
+        "first_request": startup_timings["first_request"],
+    }
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    doc_processor = resources.doc_processor
+    extraction_cache = doc_processor.extraction_cache
+    retrieval_cache = doc_processor.retrieval_cache
+    answer_cache = google_agent.answer_cache if google_agent is not None else None
+    return {
+        "extraction": extraction_cache.stats() if extraction_cache is not None else None,
+        "retrieval": retrieval_cache.stats() if retrieval_cache is not None else None,
+        "answer": answer_cache.stats() if answer_cache is not None else None,
+    }
+
+
 @app.post("/upload")
-async def upload_file(file: UploadFile = File(...), pages_to_process: int = Query(None)):
-    """
-    Accepts a file upload (PDF or image), processes it to extract text,
-    and returns the extracted text in JSON format.
-    """
+async def upload_file(file: UploadFile = File(...), pages_to_process: int = Query(None), wait: bool = Query(False)):
+    """Extracts an uploaded image directly; PDFs are queued as an ingestion job unless `wait=true`."""
     file_extension = file.filename.split(".")[-1].lower()
     file_content = await file.read()
 
-    if file_extension == "pdf":
+    if file_extension == "pdf" and not wait:
         try:
-            images = doc_processor.convert_pdf_to_images(file_content)
-            
-            if pages_to_process is not None:
-                images = images[:pages_to_process]
+            job_id = await run_in_threadpool(resources.ingestion_jobs.submit, file_content, file.filename, pages_to_process)
+            return {"filename": file.filename, "job_id": job_id, "status": "queued"}
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"An error occurred while processing the PDF: {e}")
 
-            extracted_text = []
-            for image in images:
-                extracted_text.append(doc_processor.process_image(image))
-            
-            # with ThreadPoolExecutor() as executor:
-            #     extracted_text = list(executor.map(doc_processor.process_image, images))
+    elif file_extension == "pdf":
+        try:
+            # Pages are triaged and rendered lazily as workers free up; all of it
+            # is blocking, so it runs off the event loop.
+            pages = resources.doc_processor.triage_pdf(file_content, max_pages=pages_to_process)
+            extracted_text = await run_in_threadpool(resources.page_extractor.process_pages, pages, file.filename)
             
-            return {"filename": file.filename, "content": extracted_text}
+            return {"filename": file.filename, "content": extracted_text, "triage": triage_report(extracted_text)}
 
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"An error occurred while processing the PDF: {e}")
 
     elif file_extension in ["png", "jpg", "jpeg", "gif", "bmp"]:
         try:
-            response_text = doc_processor.process_document(file_content)
-            extracted_data = json.loads(response_text)
+            # process_document already returns the parsed {"text", "summary"} dict.
+            extracted_data = await run_in_threadpool(resources.doc_processor.process_document, file_content)
             return {"filename": file.filename, "content": [extracted_data]}
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"An error occurred while processing the image: {e}")
     else:
         raise HTTPException(status_code=400, detail="Unsupported file type. Please upload a PDF or an image file.")
 
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    # The job store is SQLite; keep its disk I/O off the event loop.
+    job = await run_in_threadpool(resources.ingestion_jobs.store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    store = resources.ingestion_jobs.store
+    job = await run_in_threadpool(store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    results = await run_in_threadpool(store.results, job_id)
+    return {"job_id": job_id, "filename": job["filename"], "status": job["status"], "content": results, "triage": triage_report(results)}
+
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    status = await run_in_threadpool(resources.ingestion_jobs.cancel, job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return {"job_id": job_id, "status": status}
+
+
 class ChatRequest(BaseModel):
     question: str
+    # When set, history and earlier tool results are kept server-side under this ID,
+    # so `question` should be just the new message.
+    session_id: Optional[str] = None
+    # Skip the answer cache and always run the agent.
+    bypass_cache: bool = False
 
 @app.post("/chat")
 async def chat(request: ChatRequest):
     if google_agent is None:
         raise HTTPException(status_code=503, detail="Agent not initialized.")
     try:
-        response = google_agent.query(request.question)
+        response = await google_agent.aquery(request.question, session_id=request.session_id, use_cache=not request.bypass_cache)
         
         if "messages" in response and isinstance(response["messages"], list):
             serializable_messages = []
             for msg in response["messages"]:
                 if isinstance(msg, BaseMessage):
                     
-                    content_str = ""
-                    if isinstance(msg.content, list):
-                        # Handle list of content parts (e.g., from multimodal output)
-                        for part in msg.content:
-                            if isinstance(part, dict) and 'text' in part:
-                                content_str += part['text']
-                    else:
-                        # Fallback for simple string content
-                        content_str = str(msg.content)
+                    # Content may be a list of parts (e.g., from multimodal output)
+                    content_str = message_text(msg.content)
 
                     msg_dict = {
                         "id": str(msg.id),
@@ -127,8 +242,38 @@ async def chat(request: ChatRequest):
                 else:
                     serializable_messages.append({"id": "unknown", "type": "unknown", "content": str(msg)})
 
-            return {"messages": serializable_messages}
+            return {"messages": serializable_messages, "session_id": request.session_id, "route": response.get("route")}
 
         return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {e}")
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Server-sent events version of /chat, ending with a `done` event."""
+    if google_agent is None:
+        raise HTTPException(status_code=503, detail="Agent not initialized.")
+
+    async def event_stream():
+        try:
+            async for event in google_agent.astream(request.question, session_id=request.session_id):
+                yield f"event: {event['event']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'detail': f'An error occurred: {e}'})}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    if google_agent is None:
+        raise HTTPException(status_code=503, detail="Agent not initialized.")
+    if not await run_in_threadpool(google_agent.sessions.delete, session_id):
+        raise HTTPException(status_code=404, detail="Session not found.")
+    return {"session_id": session_id, "deleted": True}
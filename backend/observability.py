@@ -0,0 +1,234 @@
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+
+# Set per HTTP request (and per ingestion job) so spans from every stage can be tied together.
+request_id_var = contextvars.ContextVar("request_id", default=None)
+# Spans finished during the current request, collected for the slow-request trace log.
+request_spans_var = contextvars.ContextVar("request_spans", default=None)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+# Request IDs accepted from callers; they end up in log lines and profile file names.
+REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+def new_request_id():
+    return uuid.uuid4().hex
+
+
+def request_id_from(header):
+    """Returns the caller's request ID if it is a safe token, or a freshly generated one."""
+    if header and REQUEST_ID_PATTERN.fullmatch(header):
+        return header
+    return new_request_id()
+
+
+class Metrics:
+    """Thread-safe counters, gauges and histograms, rendered in the Prometheus text format."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.help = {}
+        self.types = {}
+        self.values = {}
+        self.histograms = {}
+
+    def describe(self, name, kind, help_text):
+        with self.lock:
+            self.types[name] = kind
+            self.help[name] = help_text
+
+    @staticmethod
+    def _key(labels):
+        return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+    def inc(self, name, amount=1, **labels):
+        """Adds to a counter or, with a negative amount, moves a gauge down."""
+        key = self._key(labels)
+        with self.lock:
+            self.types.setdefault(name, "counter")
+            series = self.values.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.types.setdefault(name, "gauge")
+            self.values.setdefault(name, {})[self._key(labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.types.setdefault(name, "histogram")
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram["buckets"][position] += 1
+                    break
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    @staticmethod
+    def _labels(key, extra=()):
+        pairs = list(key) + list(extra)
+        if not pairs:
+            return ""
+        escaped = []
+        for name, value in pairs:
+            value = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            escaped.append(f'{name}="{value}"')
+        return "{" + ",".join(escaped) + "}"
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for name in sorted(set(self.values) | set(self.histograms)):
+                if name in self.help:
+                    lines.append(f"# HELP {name} {self.help[name]}")
+                lines.append(f"# TYPE {name} {self.types[name]}")
+                for key, value in sorted(self.values.get(name, {}).items()):
+                    lines.append(f"{name}{self._labels(key)} {value}")
+                for key, histogram in sorted(self.histograms.get(name, {}).items()):
+                    cumulative = 0
+                    for bound, count in zip(self.buckets, histogram["buckets"]):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{self._labels(key, [('le', str(bound))])} {cumulative}")
+                    lines.append(f"{name}_bucket{self._labels(key, [('le', '+Inf')])} {histogram['count']}")
+                    lines.append(f"{name}_sum{self._labels(key)} {histogram['sum']}")
+                    lines.append(f"{name}_count{self._labels(key)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+metrics.describe("rag_stage_duration_seconds", "histogram", "Time spent in each pipeline stage.")
+metrics.describe("rag_stage_in_flight", "gauge", "Pipeline stages currently running.")
+metrics.describe("rag_stage_errors_total", "counter", "Pipeline stages that raised.")
+metrics.describe("rag_http_request_duration_seconds", "histogram", "HTTP request latency up to the start of the response.")
+metrics.describe("rag_http_requests_in_flight", "gauge", "HTTP requests currently being handled.")
+metrics.describe("rag_llm_tokens_total", "counter", "Tokens reported by the model provider.")
+metrics.describe("rag_answer_cache_requests_total", "counter", "Chat answers by cache outcome (hit, miss or coalesced).")
+metrics.describe("rag_triage_pages_total", "counter", "PDF pages by extraction path (text layer or vision model).")
+metrics.describe("rag_router_decisions_total", "counter", "Chat questions by whether the router sent them to the web, and why.")
+metrics.describe("rag_web_search_timeouts_total", "counter", "Web searches abandoned for exceeding WEB_SEARCH_TIMEOUT.")
+
+
+@contextmanager
+def span(stage, **attributes):
+    """Times one pipeline stage into rag_stage_duration_seconds and the current request's trace."""
+    metrics.inc("rag_stage_in_flight", 1, stage=stage)
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        metrics.inc("rag_stage_in_flight", -1, stage=stage)
+        metrics.observe("rag_stage_duration_seconds", duration, stage=stage)
+        if status == "error":
+            metrics.inc("rag_stage_errors_total", stage=stage)
+        record = {
+            "request_id": request_id_var.get(),
+            "stage": stage,
+            "duration_ms": round(duration * 1000, 2),
+            "status": status,
+            **attributes,
+        }
+        spans = request_spans_var.get()
+        if spans is not None:
+            spans.append(record)
+        logging.debug(f"span {json.dumps(record, default=str)}")
+
+
+def record_llm_usage(model, input_tokens, output_tokens):
+    if input_tokens:
+        metrics.inc("rag_llm_tokens_total", input_tokens, model=model, kind="input")
+    if output_tokens:
+        metrics.inc("rag_llm_tokens_total", output_tokens, model=model, kind="output")
+
+
+def record_message_usage(messages):
+    """Counts tokens on LangChain AI messages, from usage_metadata or, failing that, response_metadata."""
+    for message in messages:
+        if getattr(message, "type", None) != "ai":
+            continue
+        response_metadata = getattr(message, "response_metadata", None) or {}
+        usage = getattr(message, "usage_metadata", None) or response_metadata.get("usage_metadata") or {}
+        model = response_metadata.get("model_name") or "unknown"
+        record_llm_usage(model, usage.get("input_tokens", 0), usage.get("output_tokens", 0))
+
+
+class SamplingProfiler:
+    """Samples the stacks of all other threads into collapsed form, as read by flamegraph.pl and speedscope."""
+
+    def __init__(self, interval=None):
+        self.interval = interval or float(os.getenv("PROFILE_INTERVAL", "0.005"))
+        self.samples = Counter()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        return self.samples
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.samples[";".join(reversed(stack))] += 1
+
+    def write(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+_profile_lock = threading.Lock()
+
+
+@contextmanager
+def profile_request(request_id):
+    """Profiles the block when PROFILING_ENABLED=true, yielding the profile's file name, or None when not profiling."""
+    if os.getenv("PROFILING_ENABLED", "false").lower() != "true" or not _profile_lock.acquire(blocking=False):
+        yield None
+        return
+    filename = f"{request_id_from(request_id)}.folded"
+    path = os.path.join(os.getenv("PROFILE_DIR", os.path.join(".cache", "profiles")), filename)
+    profiler = SamplingProfiler().start()
+    try:
+        yield filename
+    finally:
+        profiler.stop()
+        _profile_lock.release()
+        profiler.write(path)
+        logging.info(f"Request {request_id} profile written to {path} ({sum(profiler.samples.values())} samples).")
@@ -0,0 +1,27 @@
+"""
+Removes duplicate chunks from the configured Qdrant collection.
+
+Points ingested before deterministic IDs were introduced got random IDs, so
+re-uploads left several copies of the same chunk. Run from the backend
+directory:
+
+    python -m pipeline_for_docement_ingestion.dedupCollection --dry-run
+    python -m pipeline_for_docement_ingestion.dedupCollection
+"""
+import argparse
+from pipeline_for_docement_ingestion.docsProcessing import DocsProcessor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Only report how many duplicates would be removed.")
+    args = parser.parse_args()
+
+    doc_processor = DocsProcessor(extraction_cache=False)
+    duplicates = doc_processor.remove_duplicate_points(dry_run=args.dry_run)
+    action = "Would remove" if args.dry_run else "Removed"
+    print(f"{action} {duplicates} duplicate points from {doc_processor.collection_name}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,128 @@
 import os
+import random
+import threading
+import time
+import uuid
+import hashlib
+import httpx
 from dotenv import load_dotenv
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 from PIL import Image
 from io import BytesIO
 import json
 import fitz  # PyMuPDF
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from qdrant_client.models import Distance, VectorParams
+from qdrant_client.models import Distance, VectorParams, PointStruct, PayloadSchemaType, Filter, FieldCondition, MatchValue, MatchAny
 from langchain_qdrant import Qdrant
 from qdrant_client import QdrantClient
 from langchain_core.documents import Document
 import logging
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+from common import LazyInit
+from pipeline_for_docement_ingestion.extractionCache import ExtractionCache
+from pipeline_for_docement_ingestion.retrievalCache import RetrievalCache
+from pipeline_for_docement_ingestion.sparseIndex import SparseIndex
+from pipeline_for_docement_ingestion.pageTriage import PageTriage
+from pipeline_for_docement_ingestion.structuredChunker import StructuredChunker
+from observability import metrics, span, record_llm_usage
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 load_dotenv()
 
-class DocsProcessor:
-    def __init__(self):
+# Errors raised by the Gemini API when we are being throttled or the service is overloaded.
+RETRYABLE_MODEL_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+)
+
+# Page text returned by process_document when the model call fails; it is never indexed.
+EXTRACTION_ERROR_TEXT = "ERROR PROCESSING THE PAGE"
+
+# Namespace for deterministic point IDs; changing it would re-key every stored chunk.
+POINT_ID_NAMESPACE = uuid.UUID("6f1c3b2e-5a4d-4c1e-9b7a-2d8e0f3a9c51")
+
+
+def chunk_point_id(page_content, metadata):
+    """Stable point ID from the chunk's text, filename and page, so re-ingesting overwrites instead of duplicating."""
+    metadata = metadata or {}
+    content_hash = hashlib.sha256(page_content.encode()).hexdigest()
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{metadata.get('filename')}|{metadata.get('page')}|{content_hash}"))
+
+
+def create_qdrant_client():
+    """Qdrant client with a bounded keep-alive connection pool, shared by ingestion and retrieval."""
+    limits = httpx.Limits(
+        max_connections=int(os.getenv("QDRANT_MAX_CONNECTIONS", "20")),
+        max_keepalive_connections=int(os.getenv("QDRANT_MAX_KEEPALIVE_CONNECTIONS", "10")),
+    )
+    return QdrantClient(api_key=os.getenv("QUADRANT_API_KEY"), url=os.getenv("QUADRANT_API_KEY_LOCATION"), limits=limits)
+
+
+RETRIEVAL_MODES = ("dense", "sparse", "hybrid")
+
+CHUNKING_STRATEGIES = ("structured", "recursive")
+
+# Chunk metadata fields that get a Qdrant payload index, so filtered searches stay fast.
+PAYLOAD_INDEXES = {
+    "filename": PayloadSchemaType.KEYWORD,
+    "page": PayloadSchemaType.INTEGER,
+    "section": PayloadSchemaType.KEYWORD,
+    "is_table": PayloadSchemaType.BOOL,
+}
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Fuses several ranked lists of IDs; an ID's score is the sum of 1 / (k + rank) over the lists."""
+    scores = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, start=1):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class DocsProcessor(LazyInit):
+    def __init__(self, model=None, embeddings=None, client=None, extraction_cache=None, retrieval_cache=None, sparse_index=None):
+        """`model`, `embeddings` and `client` that are not injected are created on first use."""
         logging.info("Initializing DocsProcessor...")
-        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-        self.model = genai.GenerativeModel(model_name="gemini-2.0-flash-lite", generation_config=genai.GenerationConfig(response_mime_type="application/json"))
-        self.embeddings = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004")
-        self.client = QdrantClient(api_key=os.getenv("QUADRANT_API_KEY"), url=os.getenv("QUADRANT_API_KEY_LOCATION"))
+        self._model = model
+        self._embeddings = embeddings
+        self._client = client
+        self._vector_store = None
+        self._init_lock = threading.RLock()
+        self.init_seconds = {}
+        if extraction_cache is None and os.getenv("EXTRACTION_CACHE_ENABLED", "true").lower() == "true":
+            extraction_cache = ExtractionCache()
+        # Pass extraction_cache=False to disable caching regardless of the environment.
+        self.extraction_cache = extraction_cache or None
         self.collection_name = os.getenv("COLLECTION_NAME", "BAJAJ_FINANCIAL_REPORT_TEST")
-        self.client.get_collection(self.collection_name)
-        self.vector_store = Qdrant(self.client, self.collection_name, self.embeddings)
-        self.text_splitter = RecursiveCharacterTextSplitter(chunk_size=3000,chunk_overlap=100)
-        logging.info("Vector store initialized.")
+        # CHUNK_SIZE_<COLLECTION_NAME> overrides CHUNK_SIZE, so collections of different documents can be tuned apart.
+        self.chunk_size = int(os.getenv(f"CHUNK_SIZE_{self.collection_name}", os.getenv("CHUNK_SIZE", "1000")))
+        self.chunk_overlap = int(os.getenv("CHUNK_OVERLAP", "100"))
+        self.chunking_strategy = os.getenv("CHUNKING_STRATEGY", "structured").lower()
+        if self.chunking_strategy not in CHUNKING_STRATEGIES:
+            raise ValueError(f"Unsupported chunking strategy: {self.chunking_strategy}")
+        self.text_splitter = RecursiveCharacterTextSplitter(chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap)
+        self.chunker = StructuredChunker(self.chunk_size, self.chunk_overlap)
+        self.embedding_batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+        if retrieval_cache is None and os.getenv("RETRIEVAL_CACHE_ENABLED", "true").lower() == "true":
+            retrieval_cache = RetrievalCache()
+        self.retrieval_cache = retrieval_cache or None
+        # Bumped on every write to the collection; answer caches key on it.
+        self.corpus_version = 0
+        self.sparse_index_enabled = sparse_index is not False and os.getenv("SPARSE_INDEX_ENABLED", "true").lower() == "true"
+        self._sparse_index = sparse_index or None
+        self.retrieval_mode = os.getenv("RETRIEVAL_MODE", "dense")
+        self.hybrid_fetch_k = int(os.getenv("HYBRID_FETCH_K", "20"))
+        # Bounds the number of concurrent Gemini calls across every upload handled by this process.
+        self.max_in_flight = int(os.getenv("GEMINI_MAX_IN_FLIGHT", "4"))
+        self.model_slots = threading.BoundedSemaphore(self.max_in_flight)
+        self.max_retries = int(os.getenv("GEMINI_MAX_RETRIES", "5"))
+        self.retry_base_delay = float(os.getenv("GEMINI_RETRY_BASE_DELAY", "1.0"))
+        # Decides which PDF pages can skip the vision model (see triage_pdf).
+        self.page_triage = PageTriage()
         self.prompt = """You are an advanced financial document processing OCR system. 
             Your task is to extract **all textual content from the provided document**, preserving **every single detail**. This includes:
 
@@ -59,6 +153,56 @@ class DocsProcessor:
             6. **Do not skip, compress, or ignore any content.** Only format it cleanly for readability.
             """
 
+    @property
+    def model(self):
+        def create():
+            genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+            return genai.GenerativeModel(model_name="gemini-2.0-flash-lite", generation_config=genai.GenerationConfig(response_mime_type="application/json"))
+        return self._lazy("_model", create)
+
+    @property
+    def model_name(self):
+        return getattr(self.model, "model_name", type(self.model).__name__)
+
+    @property
+    def embeddings(self):
+        return self._lazy("_embeddings", lambda: GoogleGenerativeAIEmbeddings(model="models/text-embedding-004"))
+
+    @property
+    def client(self):
+        return self._lazy("_client", create_qdrant_client)
+
+    @property
+    def vector_store(self):
+        def create():
+            self.client.get_collection(self.collection_name)
+            vector_store = Qdrant(self.client, self.collection_name, self.embeddings)
+            self._ensure_payload_indexes(vector_store.metadata_payload_key)
+            logging.info("Vector store initialized.")
+            return vector_store
+        return self._lazy("_vector_store", create)
+
+    def _ensure_payload_indexes(self, metadata_key):
+        """Creates the payload indexes used by filtered search; creating an existing index is a no-op."""
+        for field, schema in PAYLOAD_INDEXES.items():
+            try:
+                self.client.create_payload_index(self.collection_name, field_name=f"{metadata_key}.{field}", field_schema=schema)
+            except Exception as e:
+                logging.warning(f"Could not create payload index on {metadata_key}.{field}: {e}")
+
+    @property
+    def sparse_index(self):
+        """The BM25 index, rebuilt from the collection when its store is empty; None when disabled."""
+        if not self.sparse_index_enabled:
+            return None
+
+        def create():
+            sparse_index = SparseIndex(self.collection_name)
+            if len(sparse_index) == 0 and self.client.count(self.collection_name).count:
+                sparse_index.rebuild(self.scroll_chunks())
+            return sparse_index
+        return self._lazy("_sparse_index", create)
+
     def process_document(self, image_bytes):
         logging.info("Processing document...")
         try:
@@ -75,28 +219,80 @@ class DocsProcessor:
                 "data": image_bytes
             }
 
-            response = self.model.generate_content([self.prompt, image_part])
+            cache_key = None
+            if self.extraction_cache is not None:
+                cache_key = ExtractionCache.make_key(image_bytes, self.prompt, self.model_name)
+                cached = self.extraction_cache.get(cache_key)
+                if cached is not None:
+                    logging.info("Document served from extraction cache.")
+                    return cached
+
+            response = self.generate_content([self.prompt, image_part])
+            response_data = json.loads(response.text)
+            if cache_key is not None:
+                self.extraction_cache.set(cache_key, response_data)
             logging.info("Document processing successful.")
-            return json.loads(response.text)
+            return response_data
         except Exception as e:
             logging.error(f"An error occurred during document processing: {e}")
-            return {"text": "ERROR PROCESSING THE PAGE", "summary": "NULL"}
-            
+            return {"text": EXTRACTION_ERROR_TEXT, "summary": "NULL"}
+
+    def generate_content(self, parts):
+        """Calls the model in one of the in-flight slots, backing off while Gemini rate-limits."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.model_slots:
+                    with span("vision", model=self.model_name, attempt=attempt):
+                        response = self.model.generate_content(parts)
+                usage = getattr(response, "usage_metadata", None)
+                if usage is not None:
+                    record_llm_usage(self.model_name, usage.prompt_token_count, usage.candidates_token_count)
+                return response
+            except RETRYABLE_MODEL_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.retry_base_delay * (2 ** attempt) + random.uniform(0, self.retry_base_delay)
+                logging.warning(f"Model call rate-limited ({e}), retrying in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries})")
+                time.sleep(delay)
 
     def process_image(self, image):
         logging.info("Processing image...")
         try:
             img_byte_arr = BytesIO()
             image.save(img_byte_arr, format='PNG')
-            img_byte_arr = img_byte_arr.getvalue()
-            response_data = self.process_document(img_byte_arr)
-            self.add_documents(response_data['text'], response_data['summary'])
-            logging.info(f"Image processing successful")
-            return response_data
+            return self.process_page(img_byte_arr.getvalue())
         except Exception as e:
             logging.error(f"An error occurred during image processing: {e}")
             raise
 
+    def process_page(self, image_bytes, index=True, metadata=None):
+        """Extracts one page image and, unless `index` is False, indexes its chunks with `metadata`."""
+        logging.info("Processing page...")
+        try:
+            response_data = self.process_document(image_bytes)
+            if response_data["text"] == EXTRACTION_ERROR_TEXT:
+                # Keep the placeholder out of the collection; the page is reported as failed instead.
+                if index:
+                    response_data["indexing"] = {"chunks": 0, "indexed": 0, "failed": [{"chunk": None, "error": "extraction failed"}]}
+            elif index:
+                response_data["indexing"] = self.add_documents(response_data['text'], response_data['summary'], metadata)
+            logging.info("Page processing successful")
+            return response_data
+        except Exception as e:
+            logging.error(f"An error occurred during page processing: {e}")
+            raise
+
+    def process_triaged_page(self, page, index=True, metadata=None):
+        """Processes a page from triage_pdf: vision pages through process_page, text pages as extracted."""
+        if "image" in page:
+            response_data = self.process_page(page["image"], index=index, metadata=metadata)
+        else:
+            response_data = {"text": page["text"], "summary": page["summary"]}
+            if index:
+                response_data["indexing"] = self.add_documents(page["text"], page["summary"], metadata)
+        response_data["extraction"] = page["extraction"]
+        return response_data
+
     def convert_pdf_to_images(self, file_content):
         logging.info("Converting PDF to images...")
         try:
@@ -111,31 +307,314 @@ class DocsProcessor:
         except Exception as e:
             logging.error(f"An error occurred during PDF to image conversion: {e}")
             raise
+
+    @staticmethod
+    def _raster_settings(dpi=None, image_format=None):
+        dpi = dpi or int(os.getenv("RASTER_DPI", "72"))
+        image_format = (image_format or os.getenv("RASTER_FORMAT", "png")).lower()
+        if image_format not in ["png", "jpeg", "jpg"]:
+            raise ValueError(f"Unsupported raster format: {image_format}")
+        return dpi, image_format
+
+    @staticmethod
+    def _page_numbers(doc, max_pages=None, page_numbers=None):
+        if page_numbers is not None:
+            return page_numbers
+        page_count = doc.page_count if max_pages is None else min(max_pages, doc.page_count)
+        return range(1, page_count + 1)
+
+    @staticmethod
+    def _render_page(page, dpi, image_format):
+        with span("rasterize", page=page.number + 1, dpi=dpi):
+            pix = page.get_pixmap(dpi=dpi)
+            page_bytes = pix.tobytes(image_format)
+            del pix
+        return page_bytes
+
+    def rasterize_pdf(self, file_content, max_pages=None, dpi=None, image_format=None, page_numbers=None):
+        """Lazily yields encoded images of the first `max_pages` pages, or of the 1-based `page_numbers`."""
+        dpi, image_format = self._raster_settings(dpi, image_format)
+        logging.info(f"Rasterizing PDF at {dpi} DPI as {image_format}...")
+        with fitz.open(stream=file_content, filetype="pdf") as doc:
+            rendered = 0
+            for page_number in self._page_numbers(doc, max_pages, page_numbers):
+                page_bytes = self._render_page(doc[page_number - 1], dpi, image_format)
+                rendered += 1
+                yield page_bytes
+            logging.info(f"Rasterized {rendered} pages from PDF.")
+
+    def triage_pdf(self, file_content, max_pages=None, dpi=None, image_format=None, page_numbers=None):
+        """Like rasterize_pdf, but yields a triaged page dict for process_triaged_page; text pages are never rendered."""
+        dpi, image_format = self._raster_settings(dpi, image_format)
+        logging.info(f"Triaging PDF pages with the '{self.page_triage.policy}' policy...")
+        with fitz.open(stream=file_content, filetype="pdf") as doc:
+            counts = {"text": 0, "vision": 0}
+            for page_number in self._page_numbers(doc, max_pages, page_numbers):
+                page = doc[page_number - 1]
+                with span("triage", page=page_number):
+                    decision, tables = self.page_triage.assess(page)
+                    if decision["path"] == "text":
+                        text = self.page_triage.extract_text(page, tables)
+                metrics.inc("rag_triage_pages_total", path=decision["path"], reason=decision["reason"])
+                counts[decision["path"]] += 1
+                if decision["path"] == "text":
+                    yield {"text": text, "summary": self.page_triage.summarize_text(text), "extraction": decision}
+                else:
+                    yield {"image": self._render_page(page, dpi, image_format), "extraction": decision}
+            logging.info(f"Triaged {counts['text'] + counts['vision']} pages: {counts['text']} from the text layer, {counts['vision']} for the vision model.")
     
-    def add_documents(self, text, summary):
+    def split_documents(self, text, summary, metadata=None):
+        """Splits a page into chunks with the configured chunking strategy."""
+        with span("split", characters=len(text), strategy=self.chunking_strategy):
+            metadata = {"summary": summary, **(metadata or {})}
+            if self.chunking_strategy == "structured":
+                chunks = self.chunker.split_documents(text, metadata)
+            else:
+                chunks = self.text_splitter.split_documents([Document(page_content=text, metadata=metadata)])
+            for index, chunk in enumerate(chunks):
+                chunk.metadata["chunk"] = index
+            return chunks
+
+    def add_documents(self, text, summary, metadata=None):
         logging.info("Adding document to vector store...")
         try:
-            document = Document(page_content=text, metadata={"summary": summary})
-            document_chunks = self.text_splitter.split_documents([document])
-            for docs in document_chunks:
-                try:
-                    self.vector_store.add_documents([docs])
-                    logging.info("Document added to vector store successfully.")
-                except Exception as e:
-                    logging.error(f"Failed to add document chunk to vector store: {e}")
-                    continue
+            return self.index_chunks(self.split_documents(text, summary, metadata))
         except Exception as e:
             logging.error(f"An error occurred while adding document to vector store: {e}")
-            return "ERROR ADDING DOCUMENT TO VECTOR STORE BECAUSE THE CONTEXT TOO LARGE" 
-    
-    def search_documents(self, query, k=6):
-        logging.info(f"Searching documents for query: {query}")
+            return {"chunks": 0, "indexed": 0, "failed": [{"chunk": None, "error": str(e)}]}
+
+    def index_chunks(self, chunks):
+        """Embeds and upserts chunks in batches, retrying a failed batch chunk by chunk to report which failed."""
+        report = {"chunks": len(chunks), "indexed": 0, "failed": []}
+        for start in range(0, len(chunks), self.embedding_batch_size):
+            batch = chunks[start:start + self.embedding_batch_size]
+            try:
+                self.upsert_chunks(batch)
+                report["indexed"] += len(batch)
+            except Exception as e:
+                logging.warning(f"Batch upsert of {len(batch)} chunks failed ({e}), retrying chunk by chunk")
+                for offset, chunk in enumerate(batch):
+                    try:
+                        self.upsert_chunks([chunk])
+                        report["indexed"] += 1
+                    except Exception as chunk_error:
+                        logging.error(f"Failed to add document chunk {start + offset} to vector store: {chunk_error}")
+                        report["failed"].append({"chunk": start + offset, "error": str(chunk_error)})
+        if report["indexed"]:
+            self.collection_changed()
+        logging.info(f"Indexed {report['indexed']}/{report['chunks']} chunks.")
+        return report
+
+    def upsert_chunks(self, chunks):
+        # Identical chunks map to the same point, so only embed each one once.
+        unique_chunks = {chunk_point_id(chunk.page_content, chunk.metadata): chunk for chunk in chunks}
+        with span("embed", texts=len(unique_chunks)):
+            vectors = self.embeddings.embed_documents([chunk.page_content for chunk in unique_chunks.values()])
+        vector_name = self.vector_store.vector_name
+        points = [
+            PointStruct(
+                id=point_id,
+                vector=vector if vector_name is None else {vector_name: vector},
+                payload={
+                    self.vector_store.content_payload_key: chunk.page_content,
+                    self.vector_store.metadata_payload_key: chunk.metadata,
+                },
+            )
+            for (point_id, chunk), vector in zip(unique_chunks.items(), vectors)
+        ]
+        with span("upsert", points=len(points)):
+            self.client.upsert(collection_name=self.collection_name, points=points, wait=True)
+        if self.sparse_index is not None:
+            self.sparse_index.add((point_id, chunk.page_content) for point_id, chunk in unique_chunks.items())
+
+    def scroll_chunks(self, scroll_batch_size=256):
+        """Yields `(point_id, text)` for every point in the collection."""
+        content_key = self.vector_store.content_payload_key
+        offset = None
+        while True:
+            records, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                limit=scroll_batch_size,
+                offset=offset,
+                with_payload=[content_key],
+                with_vectors=False,
+            )
+            for record in records:
+                yield str(record.id), (record.payload or {}).get(content_key) or ""
+            if offset is None:
+                break
+
+    def remove_duplicate_points(self, dry_run=False, scroll_batch_size=256):
+        """Deletes points duplicating another's text and source (text alone for legacy points); returns the count."""
+        logging.info(f"Scanning {self.collection_name} for duplicate points...")
+        content_key = self.vector_store.content_payload_key
+        metadata_key = self.vector_store.metadata_payload_key
+        groups = {}
+        # Content hashes of points with a source, and the groups of legacy points without one.
+        sourced_hashes = set()
+        legacy_groups = {}
+        offset = None
+        while True:
+            records, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                limit=scroll_batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False,
+            )
+            for record in records:
+                payload = record.payload or {}
+                content = payload.get(content_key) or ""
+                metadata = payload.get(metadata_key) or {}
+                canonical_id = chunk_point_id(content, metadata)
+                groups.setdefault(canonical_id, []).append(str(record.id))
+                content_hash = hashlib.sha256(content.encode()).hexdigest()
+                if metadata.get("filename") is None and metadata.get("page") is None:
+                    legacy_groups[canonical_id] = content_hash
+                else:
+                    sourced_hashes.add(content_hash)
+            if offset is None:
+                break
+
+        duplicates = []
+        for canonical_id, point_ids in groups.items():
+            if legacy_groups.get(canonical_id) in sourced_hashes:
+                duplicates.extend(point_ids)
+                continue
+            keep = canonical_id if canonical_id in point_ids else point_ids[0]
+            duplicates.extend(point_id for point_id in point_ids if point_id != keep)
+        logging.info(f"Found {len(duplicates)} duplicate points in {len(groups)} distinct chunks.")
+
+        if not dry_run:
+            for start in range(0, len(duplicates), scroll_batch_size):
+                self.client.delete(
+                    collection_name=self.collection_name,
+                    points_selector=duplicates[start:start + scroll_batch_size],
+                    wait=True,
+                )
+            if self.sparse_index is not None:
+                self.sparse_index.remove(duplicates)
+            if duplicates:
+                self.collection_changed()
+            logging.info(f"Removed {len(duplicates)} duplicate points.")
+        return len(duplicates)
+
+    def collection_changed(self):
+        """Called after every write to the collection so cached search results and answers are dropped."""
+        self.corpus_version += 1
+        if self.retrieval_cache is not None:
+            self.retrieval_cache.invalidate()
+
+    def query_embedding(self, query):
+        """Embeds `query`, reusing the retrieval cache's copy when there is one."""
+        cache = self.retrieval_cache
+        embedding = cache.get_embedding(query) if cache is not None else None
+        if embedding is None:
+            with span("embed", texts=1):
+                embedding = self.embeddings.embed_query(query)
+            if cache is not None:
+                cache.set_embedding(query, embedding)
+        return embedding
+
+    def corpus_similarity(self, query, embedding=None):
+        """Score of the chunk closest to `query`, or None when the collection is empty."""
+        if embedding is None:
+            embedding = self.query_embedding(query)
+        with span("corpus_similarity"):
+            results = self.vector_store.similarity_search_with_score_by_vector(embedding, k=1)
+        return results[0][1] if results else None
+
+    def sparse_confident(self, query, k=6):
+        """True when hybrid search would answer `query` from the sparse index without embedding it."""
+        if self.retrieval_mode != "hybrid" or self.sparse_index is None:
+            return False
+        with span("sparse_search", mode="hybrid"):
+            hits = self.sparse_index.search(query, self.hybrid_fetch_k)
+        return self.sparse_index.is_confident(query, hits, k)
+
+    def build_filter(self, filters):
+        """Turns `{"filename": "a.pdf", "page": [3, 4]}` into a Qdrant filter on chunk metadata, or None."""
+        conditions = []
+        for field, value in (filters or {}).items():
+            if value is None:
+                continue
+            if field not in PAYLOAD_INDEXES:
+                raise ValueError(f"Unsupported search filter: {field}")
+            match = MatchAny(any=list(value)) if isinstance(value, (list, tuple, set)) else MatchValue(value=value)
+            conditions.append(FieldCondition(key=f"{self.vector_store.metadata_payload_key}.{field}", match=match))
+        return Filter(must=conditions) if conditions else None
+
+    def search_documents(self, query, k=6, mode=None, filters=None, embedding=None):
+        """Text of the top `k` chunks for `query`; filtered searches run dense, as the sparse index has no metadata."""
+        mode = mode or self.retrieval_mode
+        filters = {field: value for field, value in (filters or {}).items() if value is not None}
+        if filters and mode != "dense":
+            logging.info(f"Filtered search falls back from {mode} to dense retrieval.")
+            mode = "dense"
+        with span("search", mode=mode, k=k, filtered=bool(filters)):
+            return self._search_documents(query, k, mode, filters, embedding)
+
+    def _search_documents(self, query, k, mode, filters=None, embedding=None):
+        logging.info(f"Searching documents ({mode}) for query: {query}")
         try:
-            retriever = self.vector_store.as_retriever(search_type="mmr", search_kwargs={"k": k})
-            results = retriever.invoke(query)
-            joined_text = "\n\n".join(doc.page_content for doc in results)
+            if mode not in RETRIEVAL_MODES:
+                raise ValueError(f"Unsupported retrieval mode: {mode}")
+            if mode != "dense" and self.sparse_index is None:
+                raise ValueError(f"Retrieval mode '{mode}' requires SPARSE_INDEX_ENABLED=true")
+            search_filter = self.build_filter(filters)
+            # Filtered results are cached apart from unfiltered ones for the same query.
+            cache_mode = f"{mode}|{json.dumps(filters, sort_keys=True)}" if filters else mode
+            cache = self.retrieval_cache
+            generation = None
+            if cache is not None:
+                cached = cache.get(query, k, cache_mode)
+                if cached is not None:
+                    logging.info("Search served from retrieval cache.")
+                    return cached
+                generation = cache.generation
+
+            sparse_hits = []
+            if mode != "dense":
+                with span("sparse_search", mode=mode):
+                    sparse_hits = self.sparse_index.search(query, self.hybrid_fetch_k)
+                if mode == "sparse" or self.sparse_index.is_confident(query, sparse_hits, k):
+                    joined_text = "\n\n".join(text for _, _, text in sparse_hits[:k])
+                    if cache is not None:
+                        cache.record_miss()
+                        cache.set(query, k, None, joined_text, generation, mode)
+                    logging.info("Search successful, answered from the sparse index.")
+                    return joined_text
+
+            if embedding is None:
+                embedding = self.query_embedding(query)
+            if cache is not None:
+                cached = cache.get_similar(embedding, k, cache_mode)
+                if cached is not None:
+                    return cached
+                cache.record_miss()
+
+            if mode == "dense":
+                with span("mmr_search", k=k):
+                    results = self.vector_store.max_marginal_relevance_search_by_vector(embedding, k=k, filter=search_filter)
+                texts = [doc.page_content for doc in results]
+            else:
+                with span("mmr_search", k=self.hybrid_fetch_k):
+                    dense_results = self.vector_store.max_marginal_relevance_search_by_vector(
+                        embedding, k=self.hybrid_fetch_k, fetch_k=self.hybrid_fetch_k * 2
+                    )
+                texts_by_id = {str(doc.metadata.get("_id")): doc.page_content for doc in dense_results}
+                texts_by_id.update({point_id: text for point_id, _, text in sparse_hits})
+                fused = reciprocal_rank_fusion([
+                    [str(doc.metadata.get("_id")) for doc in dense_results],
+                    [point_id for point_id, _, _ in sparse_hits],
+                ])
+                texts = [texts_by_id[point_id] for point_id in fused[:k]]
+
+            joined_text = "\n\n".join(texts)
+            if cache is not None:
+                cache.set(query, k, embedding, joined_text, generation, cache_mode)
             logging.info(f"Search successful, found documents.")
             return joined_text
         except Exception as e:
             logging.error(f"An error occurred during document search: {e}")
-            raise
\ No newline at end of file
+            raise
@@ -0,0 +1,93 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+
+from common import connect_sqlite
+
+
+class ExtractionCache:
+    """SQLite cache of page extractions keyed on page bytes, prompt and model, evicting least recently used entries."""
+
+    def __init__(self, path=None, max_bytes=None):
+        self.path = path or os.getenv("EXTRACTION_CACHE_PATH", os.path.join(".cache", "extraction_cache.sqlite3"))
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv("EXTRACTION_CACHE_MAX_MB", "256")) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        self.conn = connect_sqlite(self.path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS extractions ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS extractions_last_access ON extractions (last_access)")
+        self.conn.commit()
+        logging.info(f"Extraction cache opened at {self.path}.")
+
+    @staticmethod
+    def make_key(image_bytes, prompt, model_name):
+        digest = hashlib.sha256()
+        for part in (model_name.encode(), prompt.encode(), image_bytes):
+            # Length-prefix every part so different splits of the same bytes cannot collide.
+            digest.update(len(part).to_bytes(8, "big"))
+            digest.update(part)
+        return digest.hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM extractions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute("UPDATE extractions SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        payload = json.dumps(value)
+        size = len(payload.encode())
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO extractions (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, payload, size, time.time()),
+            )
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM extractions").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self.conn.execute("SELECT key, size FROM extractions ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            self.conn.execute("DELETE FROM extractions WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM extractions")
+            self.conn.commit()
+
+    def stats(self):
+        with self.lock:
+            entries, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM extractions").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "size_bytes": size,
+            "max_bytes": self.max_bytes,
+        }
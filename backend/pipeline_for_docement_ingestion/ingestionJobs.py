@@ -0,0 +1,258 @@
+import os
+import json
+import time
+import uuid
+import queue
+import logging
+import threading
+
+import fitz  # PyMuPDF
+
+from common import connect_sqlite
+
+from pipeline_for_docement_ingestion.docsProcessing import EXTRACTION_ERROR_TEXT
+from pipeline_for_docement_ingestion.pageExtractor import PageExtractor
+from observability import request_id_var
+
+
+class IngestionJobStore:
+    """SQLite persistence for ingestion jobs, their uploaded PDF and per-page progress."""
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("INGESTION_JOBS_PATH", os.path.join(".cache", "ingestion_jobs.sqlite3"))
+        self.lock = threading.Lock()
+        self.conn = connect_sqlite(self.path)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                filename TEXT,
+                status TEXT NOT NULL,
+                total_pages INTEGER NOT NULL,
+                error TEXT,
+                file_content BLOB,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS job_pages (
+                job_id TEXT NOT NULL,
+                page_number INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                result TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (job_id, page_number)
+            );
+            """
+        )
+        # Stores created before pages counted their attempts lack the column.
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(job_pages)")}
+        if "attempts" not in columns:
+            self.conn.execute("ALTER TABLE job_pages ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+        self.conn.commit()
+
+    def create(self, filename, file_content, total_pages):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO jobs (id, filename, status, total_pages, file_content, created_at, updated_at) VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, filename, total_pages, file_content, now, now),
+            )
+            self.conn.executemany(
+                "INSERT INTO job_pages (job_id, page_number, status) VALUES (?, ?, 'pending')",
+                [(job_id, page_number) for page_number in range(1, total_pages + 1)],
+            )
+            self.conn.commit()
+        return job_id
+
+    def get(self, job_id):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT id, filename, status, total_pages, error, created_at, updated_at FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            pages = self.conn.execute(
+                "SELECT page_number, status FROM job_pages WHERE job_id = ? ORDER BY page_number", (job_id,)
+            ).fetchall()
+        counts = {"pending": 0, "done": 0, "failed": 0}
+        for _, status in pages:
+            counts[status] += 1
+        return {
+            "job_id": row[0],
+            "filename": row[1],
+            "status": row[2],
+            "total_pages": row[3],
+            "error": row[4],
+            "created_at": row[5],
+            "updated_at": row[6],
+            "pages_done": counts["done"],
+            "pages_failed": counts["failed"],
+            "pages_pending": counts["pending"],
+            "pages": [{"page": page_number, "status": status} for page_number, status in pages],
+        }
+
+    def file_content(self, job_id):
+        with self.lock:
+            row = self.conn.execute("SELECT file_content FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def pending_pages(self, job_id, max_attempts=1):
+        """Pages still to run: those never finished, plus failed ones with fewer than `max_attempts` attempts."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT page_number FROM job_pages WHERE job_id = ? AND (status = 'pending' OR (status = 'failed' AND attempts < ?)) ORDER BY page_number",
+                (job_id, max_attempts),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def results(self, job_id):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT page_number, status, result FROM job_pages WHERE job_id = ? ORDER BY page_number", (job_id,)
+            ).fetchall()
+        return [
+            {"page": page_number, "status": status, **(json.loads(result) if result else {})}
+            for page_number, status, result in rows
+        ]
+
+    def record_page(self, job_id, page_number, status, result):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE job_pages SET status = ?, result = ?, attempts = attempts + 1 WHERE job_id = ? AND page_number = ?",
+                (status, json.dumps(result), job_id, page_number),
+            )
+            self.conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time(), job_id))
+            self.conn.commit()
+
+    def set_status(self, job_id, status, error=None, expected=None):
+        """With `expected`, only changes a job currently in one of those statuses; returns whether it changed."""
+        query = "UPDATE jobs SET status = ?, error = ?, updated_at = ?, file_content = CASE WHEN ? THEN file_content ELSE NULL END WHERE id = ?"
+        # The PDF is only needed while the job can still run.
+        params = [status, error, time.time(), status in ("queued", "running"), job_id]
+        if expected:
+            query += f" AND status IN ({', '.join('?' * len(expected))})"
+            params.extend(expected)
+        with self.lock:
+            changed = self.conn.execute(query, params).rowcount > 0
+            self.conn.commit()
+        return changed
+
+    def status(self, job_id):
+        with self.lock:
+            row = self.conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def unfinished(self):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+
+class IngestionJobQueue:
+    """Runs PDF ingestion jobs on background threads, retrying failed pages and resuming jobs after a restart."""
+
+    def __init__(self, doc_processor, store=None, workers=None):
+        self.doc_processor = doc_processor
+        self.store = store or IngestionJobStore()
+        self.workers = workers or int(os.getenv("INGESTION_JOB_WORKERS", "1"))
+        self.max_page_attempts = int(os.getenv("INGESTION_MAX_PAGE_ATTEMPTS", "3"))
+        # Jobs always index page by page so that a finished page is durable on its own.
+        self.page_extractor = PageExtractor(doc_processor, batch_scope="page")
+        self.queue = queue.Queue()
+        self.threads = []
+        self.cancelled = set()
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.threads:
+                return
+            for job_id in self.store.unfinished():
+                logging.info(f"Resuming ingestion job {job_id}.")
+                # A job left running by a restart is queued again so a worker can claim it.
+                self.store.set_status(job_id, "queued", expected=("running",))
+                self.queue.put(job_id)
+            for worker in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"ingestion-job-{worker}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def submit(self, file_content, filename, max_pages=None):
+        with fitz.open(stream=file_content, filetype="pdf") as doc:
+            total_pages = doc.page_count if max_pages is None else min(max_pages, doc.page_count)
+        job_id = self.store.create(filename, file_content, total_pages)
+        logging.info(f"Queued ingestion job {job_id} for {filename} ({total_pages} pages).")
+        self.queue.put(job_id)
+        return job_id
+
+    def cancel(self, job_id):
+        status = self.store.status(job_id)
+        if status is None:
+            return None
+        if status in ("queued", "running"):
+            with self.lock:
+                self.cancelled.add(job_id)
+            if self.store.set_status(job_id, "cancelled", expected=("queued", "running")):
+                logging.info(f"Cancelled ingestion job {job_id}.")
+        return self.store.status(job_id)
+
+    def _is_cancelled(self, job_id):
+        with self.lock:
+            if job_id in self.cancelled:
+                return True
+        # Cancelled by another process, or before a restart.
+        return self.store.status(job_id) == "cancelled"
+
+    def _worker(self):
+        while True:
+            job_id = self.queue.get()
+            # Spans recorded while the job runs carry the job ID as their request ID.
+            token = request_id_var.set(f"job-{job_id}")
+            try:
+                self._run(job_id)
+            except Exception as e:
+                logging.error(f"Ingestion job {job_id} failed: {e}")
+                self.store.set_status(job_id, "failed", str(e), expected=("queued", "running"))
+            finally:
+                request_id_var.reset(token)
+                self.queue.task_done()
+
+    def _run(self, job_id):
+        # Claiming the job is a single conditional update, so a cancel that lands first is never overwritten.
+        if not self.store.set_status(job_id, "running", expected=("queued",)):
+            return
+        job = self.store.get(job_id)
+        file_content = self.store.file_content(job_id)
+
+        def record(page_number, result):
+            failed = result.get("text") == EXTRACTION_ERROR_TEXT or bool(result.get("indexing", {}).get("failed"))
+            self.store.record_page(job_id, page_number, "failed" if failed else "done", result)
+
+        # Every pass records an attempt for each page it runs, so failed pages drop out once they reach the cap.
+        while not self._is_cancelled(job_id):
+            page_numbers = self.store.pending_pages(job_id, self.max_page_attempts)
+            if not page_numbers:
+                break
+            logging.info(f"Running ingestion job {job_id}: {len(page_numbers)} of {job['total_pages']} pages to process.")
+            pages = self.doc_processor.triage_pdf(file_content, page_numbers=page_numbers)
+            self.page_extractor.process_pages(
+                pages,
+                filename=job["filename"],
+                page_numbers=page_numbers,
+                on_result=record,
+                should_stop=lambda: self._is_cancelled(job_id),
+            )
+        job = self.store.get(job_id)
+        # Only a job still running is finished, so a late cancel stands.
+        if not job["pages_failed"]:
+            self.store.set_status(job_id, "completed", expected=("running",))
+        elif not job["pages_done"]:
+            self.store.set_status(job_id, "failed", f"All {job['pages_failed']} pages failed.", expected=("running",))
+        else:
+            self.store.set_status(
+                job_id, "completed_with_errors", f"{job['pages_failed']} of {job['total_pages']} pages failed.", expected=("running",)
+            )
+        logging.info(f"Ingestion job {job_id} finished: {self.store.status(job_id)}.")
@@ -0,0 +1,103 @@
+import os
+import logging
+import itertools
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from pipeline_for_docement_ingestion.docsProcessing import EXTRACTION_ERROR_TEXT
+
+
+class PageExtractor:
+    """Runs DocsProcessor's per-page extraction on a worker pool."""
+
+    def __init__(self, doc_processor, max_workers=None, batch_scope=None):
+        self.doc_processor = doc_processor
+        self.max_workers = max_workers or int(os.getenv("INGESTION_WORKERS", "4"))
+        # "page" indexes each page as soon as it is extracted; "upload" defers
+        # indexing so chunks from every page share embedding batches.
+        self.batch_scope = batch_scope or os.getenv("INGESTION_BATCH_SCOPE", "page")
+
+    def process_images(self, images):
+        """Extracts a sequence of PIL images, returning results in page order."""
+        return self._map_in_order(self.doc_processor.process_image, images)
+
+    def process_pages(self, pages, filename=None, page_numbers=None, on_result=None, should_stop=None):
+        """Extracts encoded or triaged pages, calling `on_result(page_number, result)` in page order until `should_stop()`."""
+        index = self.batch_scope != "upload"
+        task = partial(self._process_page, index=index, filename=filename)
+        page_numbers = list(page_numbers) if page_numbers is not None else None
+        numbered_pages = zip(page_numbers if page_numbers is not None else itertools.count(1), pages)
+        page_callback = None
+        if on_result is not None:
+            page_callback = lambda numbered_page, result: on_result(numbered_page[0], result)
+        results = self._map_in_order(task, numbered_pages, page_callback, should_stop)
+        if not index:
+            self._index_upload(zip(page_numbers if page_numbers is not None else itertools.count(1), results), filename)
+        return results
+
+    def _process_page(self, numbered_page, index, filename):
+        page_number, page = numbered_page
+        metadata = self._page_metadata(filename, page_number)
+        if isinstance(page, dict):
+            return self.doc_processor.process_triaged_page(page, index=index, metadata=metadata)
+        return self.doc_processor.process_page(page, index=index, metadata=metadata)
+
+    @staticmethod
+    def _page_metadata(filename, page_number):
+        return {"filename": filename, "page": page_number}
+
+    def _index_upload(self, numbered_results, filename=None):
+        chunks = []
+        owners = []
+        results = {}
+        for page_number, result in numbered_results:
+            results[page_number] = result
+            metadata = self._page_metadata(filename, page_number)
+            if result["text"] == EXTRACTION_ERROR_TEXT:
+                result["indexing"] = {"chunks": 0, "indexed": 0, "failed": [{"chunk": None, "error": "extraction failed"}]}
+                continue
+            page_chunks = self.doc_processor.split_documents(result["text"], result["summary"], metadata)
+            chunks.extend(page_chunks)
+            owners.extend([page_number] * len(page_chunks))
+            result["indexing"] = {"chunks": len(page_chunks), "indexed": len(page_chunks), "failed": []}
+        report = self.doc_processor.index_chunks(chunks)
+        # Map failures back onto the pages they came from, using page-local chunk positions.
+        first_chunk = {}
+        for position, page_number in enumerate(owners):
+            first_chunk.setdefault(page_number, position)
+        for failure in report["failed"]:
+            page_number = owners[failure["chunk"]]
+            indexing = results[page_number]["indexing"]
+            indexing["indexed"] -= 1
+            indexing["failed"].append({"chunk": failure["chunk"] - first_chunk[page_number], "error": failure["error"]})
+        return report
+
+    def _map_in_order(self, fn, items, on_result=None, should_stop=None):
+        logging.info(f"Extracting pages with {self.max_workers} workers...")
+        results = []
+        # Keep at most two pages per worker queued so a lazy source is not drained up front.
+        window = self.max_workers * 2
+        pending = deque()
+
+        def collect():
+            item, future = pending.popleft()
+            result = future.result()
+            results.append(result)
+            if on_result is not None:
+                on_result(item, result)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for item in items:
+                if should_stop is not None and should_stop():
+                    logging.info("Extraction stopped before all pages were submitted.")
+                    break
+                # Run each page in a copy of the caller's context so its spans keep the request ID.
+                pending.append((item, executor.submit(contextvars.copy_context().run, fn, item)))
+                if len(pending) >= window:
+                    collect()
+            while pending:
+                collect()
+        logging.info(f"Extracted {len(results)} pages.")
+        return results
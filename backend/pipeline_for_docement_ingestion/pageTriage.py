@@ -0,0 +1,112 @@
+import os
+import logging
+
+import fitz  # PyMuPDF
+
+TRIAGE_POLICIES = ("auto", "vision", "text")
+
+
+class PageTriage:
+    """Decides per PDF page whether its text layer can be indexed directly or it needs the vision model."""
+
+    def __init__(self, policy=None, min_text_chars=None, max_image_coverage=None, max_drawing_coverage=None, max_table_coverage=None):
+        self.policy = (policy or os.getenv("TRIAGE_POLICY", "auto")).lower()
+        if self.policy not in TRIAGE_POLICIES:
+            raise ValueError(f"Unsupported triage policy: {self.policy}")
+        self.min_text_chars = min_text_chars if min_text_chars is not None else int(os.getenv("TRIAGE_MIN_TEXT_CHARS", "200"))
+        self.max_image_coverage = max_image_coverage if max_image_coverage is not None else float(os.getenv("TRIAGE_MAX_IMAGE_COVERAGE", "0.3"))
+        self.max_drawing_coverage = max_drawing_coverage if max_drawing_coverage is not None else float(os.getenv("TRIAGE_MAX_DRAWING_COVERAGE", "0.25"))
+        self.max_table_coverage = max_table_coverage if max_table_coverage is not None else float(os.getenv("TRIAGE_MAX_TABLE_COVERAGE", "0.6"))
+
+    @staticmethod
+    def _coverage(rects, page_rect):
+        """Fraction of the page covered by `rects` (overlaps are counted twice, the total is capped at 1)."""
+        page_area = page_rect.get_area()
+        covered = 0.0
+        for rect in rects:
+            rect = fitz.Rect(rect) & page_rect
+            if rect.is_empty:
+                continue
+            covered += rect.get_area()
+        return min(1.0, covered / page_area) if page_area else 0.0
+
+    @staticmethod
+    def _find_tables(page):
+        try:
+            return page.find_tables().tables
+        except Exception as e:
+            logging.warning(f"Table detection failed on page {page.number + 1}: {e}")
+            return []
+
+    def assess(self, page):
+        """Returns the page's `(decision, tables)`; table detection, the slowest check, runs last."""
+        decision = {"page": page.number + 1}
+        if self.policy == "vision":
+            return {**decision, "path": "vision", "reason": "policy"}, []
+        page_rect = page.rect
+        decision["text_chars"] = len(page.get_text().strip())
+        if decision["text_chars"] == 0:
+            return {**decision, "path": "vision", "reason": "no text layer"}, []
+        if self.policy == "text":
+            return {**decision, "path": "text", "reason": "policy"}, self._find_tables(page)
+        if decision["text_chars"] < self.min_text_chars:
+            return {**decision, "path": "vision", "reason": "little text"}, []
+
+        decision["image_coverage"] = round(self._coverage((info["bbox"] for info in page.get_image_info()), page_rect), 3)
+        if decision["image_coverage"] > self.max_image_coverage:
+            return {**decision, "path": "vision", "reason": "image heavy"}, []
+
+        drawings = page.get_drawings()
+        # Charts are drawn with filled shapes; table rules are stroked lines. Full-page
+        # rectangles are backgrounds or borders, not figures.
+        filled = [
+            drawing["rect"] for drawing in drawings
+            if drawing.get("fill") is not None and drawing["rect"].get_area() < 0.9 * page_rect.get_area()
+        ]
+        decision["drawing_coverage"] = round(self._coverage(filled, page_rect), 3)
+        if decision["drawing_coverage"] > self.max_drawing_coverage:
+            return {**decision, "path": "vision", "reason": "chart heavy"}, []
+
+        # Table detection looks for ruling lines, so a page without stroked paths has no tables to find.
+        stroked = any(drawing.get("color") is not None for drawing in drawings)
+        tables = self._find_tables(page) if stroked else []
+        decision["tables"] = len(tables)
+        decision["table_coverage"] = round(self._coverage((table.bbox for table in tables), page_rect), 3)
+        if decision["table_coverage"] > self.max_table_coverage:
+            return {**decision, "path": "vision", "reason": "table heavy"}, []
+        return {**decision, "path": "text", "reason": "text dominant"}, tables
+
+    @staticmethod
+    def extract_text(page, tables=()):
+        """Reads the text layer in reading order, with detected tables rendered as Markdown."""
+        table_rects = [fitz.Rect(table.bbox) for table in tables]
+        parts = []
+        for x0, y0, x1, y1, text, _, block_type in page.get_text("blocks", sort=True):
+            if block_type != 0 or not text.strip():
+                continue
+            center = fitz.Point((x0 + x1) / 2, (y0 + y1) / 2)
+            if any(center in rect for rect in table_rects):
+                continue
+            parts.append((y0, x0, text.strip()))
+        for table, rect in zip(tables, table_rects):
+            parts.append((rect.y0, rect.x0, table.to_markdown().strip()))
+        parts.sort(key=lambda part: (part[0], part[1]))
+        return "\n\n".join(text for _, _, text in parts)
+
+    @staticmethod
+    def summarize_text(text, limit=200):
+        """Stands in for the model's summary on locally extracted pages: the first line of the page."""
+        first_line = next((line.strip() for line in text.splitlines() if line.strip()), "")
+        return first_line[:limit] or "NULL"
+
+
+def triage_report(results):
+    """Summarizes which extraction path each page of an upload took."""
+    pages = [result["extraction"] for result in results if "extraction" in result]
+    text_pages = sum(1 for page in pages if page["path"] == "text")
+    return {
+        "pages": len(pages),
+        "text_pages": text_pages,
+        "vision_pages": len(pages) - text_pages,
+        "details": pages,
+    }
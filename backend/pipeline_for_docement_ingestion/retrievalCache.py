@@ -0,0 +1,125 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from common import normalize_query
+
+
+class RetrievalCache:
+    """Exact-match, embedding and optional near-duplicate cache in front of search_documents."""
+
+    def __init__(self, max_entries=None, ttl=None, similarity_threshold=None, max_embeddings=None):
+        self.max_entries = max_entries or int(os.getenv("RETRIEVAL_CACHE_MAX_ENTRIES", "512"))
+        self.ttl = ttl if ttl is not None else float(os.getenv("RETRIEVAL_CACHE_TTL", "600"))
+        if similarity_threshold is None:
+            similarity_threshold = float(os.getenv("RETRIEVAL_CACHE_SIMILARITY", "0"))
+        # A threshold of 0 disables near-duplicate matching.
+        self.similarity_threshold = similarity_threshold
+        self.max_embeddings = max_embeddings or int(os.getenv("RETRIEVAL_CACHE_MAX_EMBEDDINGS", "2048"))
+        self.entries = OrderedDict()
+        self.embeddings = OrderedDict()
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.embedding_hits = 0
+        self.embedding_misses = 0
+        self.invalidations = 0
+
+    def get(self, query, k, mode="dense"):
+        key = (normalize_query(query), k, mode)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry["expires_at"] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry["result"]
+            if entry is not None:
+                del self.entries[key]
+        return None
+
+    def get_similar(self, embedding, k, mode="dense"):
+        if not self.similarity_threshold:
+            return None
+        vector = self._unit(embedding)
+        now = time.monotonic()
+        best_key, best_score = None, self.similarity_threshold
+        with self.lock:
+            for key, entry in self.entries.items():
+                if key[1:] != (k, mode) or entry["vector"] is None or entry["expires_at"] <= now:
+                    continue
+                score = float(np.dot(vector, entry["vector"]))
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                return None
+            self.entries.move_to_end(best_key)
+            self.similar_hits += 1
+            logging.info(f"Retrieval cache near-duplicate hit on '{best_key[0]}' (similarity {best_score:.3f}).")
+            return self.entries[best_key]["result"]
+
+    def record_miss(self):
+        with self.lock:
+            self.misses += 1
+
+    def get_embedding(self, query):
+        key = normalize_query(query)
+        with self.lock:
+            embedding = self.embeddings.get(key)
+            if embedding is None:
+                self.embedding_misses += 1
+                return None
+            self.embeddings.move_to_end(key)
+            self.embedding_hits += 1
+            return embedding
+
+    def set_embedding(self, query, embedding):
+        with self.lock:
+            self.embeddings[normalize_query(query)] = embedding
+            while len(self.embeddings) > self.max_embeddings:
+                self.embeddings.popitem(last=False)
+
+    def set(self, query, k, embedding, result, generation, mode="dense"):
+        """Caches a search result unless the collection changed since `generation` was read."""
+        with self.lock:
+            if generation != self.generation:
+                return
+            self.entries[(normalize_query(query), k, mode)] = {
+                "result": result,
+                "vector": self._unit(embedding) if embedding is not None else None,
+                "expires_at": time.monotonic() + self.ttl,
+            }
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self):
+        with self.lock:
+            self.entries.clear()
+            self.generation += 1
+            self.invalidations += 1
+
+    @staticmethod
+    def _unit(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.similar_hits + self.misses
+            return {
+                "hits": self.hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.similar_hits) / lookups if lookups else 0.0,
+                "embedding_hits": self.embedding_hits,
+                "embedding_misses": self.embedding_misses,
+                "invalidations": self.invalidations,
+                "entries": len(self.entries),
+                "embeddings": len(self.embeddings),
+            }
@@ -0,0 +1,133 @@
+import os
+import re
+import math
+import logging
+import threading
+from collections import Counter
+
+from common import connect_sqlite
+
+# Keeps numbers like "1,234.56", percentages like "0.65%" and codes like ISINs as single tokens.
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.,][0-9]+)*%?")
+
+
+class SparseIndex:
+    """BM25 index over a collection's chunks, persisted to SQLite, for exact-token lookups."""
+
+    def __init__(self, collection_name, path=None, k1=1.5, b=0.75):
+        self.collection_name = collection_name
+        self.path = path or os.getenv("SPARSE_INDEX_PATH", os.path.join(".cache", "sparse_index.sqlite3"))
+        self.k1 = k1
+        self.b = b
+        self.lock = threading.RLock()
+        self.docs = {}
+        self.postings = {}
+        self.total_length = 0
+        self.conn = connect_sqlite(self.path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS sparse_chunks ("
+            "collection TEXT NOT NULL, point_id TEXT NOT NULL, text TEXT NOT NULL, PRIMARY KEY (collection, point_id))"
+        )
+        self.conn.commit()
+        rows = self.conn.execute(
+            "SELECT point_id, text FROM sparse_chunks WHERE collection = ?", (collection_name,)
+        ).fetchall()
+        for point_id, text in rows:
+            self._add_in_memory(point_id, text)
+        logging.info(f"Sparse index loaded with {len(self.docs)} chunks.")
+
+    @staticmethod
+    def tokenize(text):
+        return TOKEN_PATTERN.findall(text.lower())
+
+    def __len__(self):
+        return len(self.docs)
+
+    def _add_in_memory(self, point_id, text):
+        self._remove_in_memory(point_id)
+        term_counts = Counter(self.tokenize(text))
+        length = sum(term_counts.values())
+        self.docs[point_id] = (text, term_counts, length)
+        self.total_length += length
+        for term in term_counts:
+            self.postings.setdefault(term, set()).add(point_id)
+
+    def _remove_in_memory(self, point_id):
+        doc = self.docs.pop(point_id, None)
+        if doc is None:
+            return
+        _, term_counts, length = doc
+        self.total_length -= length
+        for term in term_counts:
+            ids = self.postings.get(term)
+            if ids is not None:
+                ids.discard(point_id)
+                if not ids:
+                    del self.postings[term]
+
+    def add(self, items):
+        """Adds or replaces `(point_id, text)` pairs."""
+        items = [(str(point_id), text) for point_id, text in items]
+        with self.lock:
+            for point_id, text in items:
+                self._add_in_memory(point_id, text)
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO sparse_chunks (collection, point_id, text) VALUES (?, ?, ?)",
+                [(self.collection_name, point_id, text) for point_id, text in items],
+            )
+            self.conn.commit()
+
+    def remove(self, point_ids):
+        point_ids = [str(point_id) for point_id in point_ids]
+        with self.lock:
+            for point_id in point_ids:
+                self._remove_in_memory(point_id)
+            self.conn.executemany(
+                "DELETE FROM sparse_chunks WHERE collection = ? AND point_id = ?",
+                [(self.collection_name, point_id) for point_id in point_ids],
+            )
+            self.conn.commit()
+
+    def search(self, query, k=20):
+        """Returns up to `k` `(point_id, score, text)` tuples, best first."""
+        terms = set(self.tokenize(query))
+        with self.lock:
+            if not self.docs:
+                return []
+            doc_count = len(self.docs)
+            average_length = self.total_length / doc_count
+            scores = Counter()
+            for term in terms:
+                ids = self.postings.get(term)
+                if not ids:
+                    continue
+                idf = math.log(1 + (doc_count - len(ids) + 0.5) / (len(ids) + 0.5))
+                for point_id in ids:
+                    _, term_counts, length = self.docs[point_id]
+                    tf = term_counts[term]
+                    scores[point_id] += idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / average_length))
+            return [(point_id, score, self.docs[point_id][0]) for point_id, score in scores.most_common(k)]
+
+    def is_confident(self, query, hits, k):
+        """True when the query's tokens with digits pin it down to at most `k` chunks, all among the top `k` hits."""
+        exact_terms = {term for term in self.tokenize(query) if any(char.isdigit() for char in term)}
+        if not exact_terms:
+            return False
+        with self.lock:
+            matching = None
+            for term in exact_terms:
+                ids = self.postings.get(term, set())
+                matching = set(ids) if matching is None else matching & ids
+        if not matching or len(matching) > k:
+            return False
+        return matching <= {point_id for point_id, _, _ in hits[:k]}
+
+    def rebuild(self, items):
+        """Replaces the whole index with `(point_id, text)` pairs, e.g. scrolled from Qdrant."""
+        with self.lock:
+            self.docs.clear()
+            self.postings.clear()
+            self.total_length = 0
+            self.conn.execute("DELETE FROM sparse_chunks WHERE collection = ?", (self.collection_name,))
+            self.add(items)
+        logging.info(f"Sparse index rebuilt with {len(self.docs)} chunks.")
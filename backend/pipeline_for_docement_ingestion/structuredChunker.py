@@ -0,0 +1,144 @@
+import re
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+MARKDOWN_HEADING = re.compile(r"^(#{1,6})\s+(.+?)\s*#*$")
+BOLD_HEADING = re.compile(r"^\*\*([^*]+)\*\*:?$")
+TABLE_SEPARATOR = re.compile(r"^\|?\s*:?-{3,}")
+# Caps lines with figures, labels or currency ("EXPENSE RATIO: 0.65%") are data, not titles.
+NOT_A_TITLE = re.compile(r"[\d:%₹$€£]|\bRS\.?\s|\bINR\b")
+
+
+def heading(line):
+    """Returns `(level, title)` when the line reads as a heading, else None."""
+    match = MARKDOWN_HEADING.match(line)
+    if match:
+        return len(match.group(1)), match.group(2).strip("*").strip()
+    match = BOLD_HEADING.match(line)
+    if match:
+        return 3, match.group(1).strip()
+    # Short ALL CAPS lines such as "PORTFOLIO HOLDINGS" are section titles in factsheets.
+    words = line.split()
+    if 0 < len(words) <= 8 and len(line) <= 60 and line.isupper() and not NOT_A_TITLE.search(line):
+        return 2, line.strip()
+    return None
+
+
+class StructuredChunker:
+    """Splits page text at headings and keeps tables whole; chunks start with their section path."""
+
+    def __init__(self, chunk_size=1000, chunk_overlap=100, max_table_size=None):
+        self.chunk_size = chunk_size
+        self.max_table_size = max_table_size or chunk_size * 4
+        self.fallback = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+    def blocks(self, text):
+        """Parses text into `(kind, body, section)` blocks, where kind is "text" or "table"."""
+        blocks = []
+        # Open sections as [level, title, has_body].
+        sections = []
+        paragraph = []
+        table = []
+
+        def section_path():
+            return " > ".join(title for _, title, _ in sections)
+
+        def add_block(kind, body):
+            blocks.append((kind, body, section_path()))
+            for section in sections:
+                section[2] = True
+
+        def close_section():
+            _, title, has_body = sections.pop()
+            if not has_body:
+                # Nothing followed the heading: emit its title under the parent section.
+                add_block("text", title)
+
+        def flush_paragraph():
+            if paragraph:
+                add_block("text", "\n".join(paragraph).strip())
+                paragraph.clear()
+
+        def flush_table():
+            if table:
+                add_block("table", "\n".join(table))
+                table.clear()
+
+        for line in text.splitlines():
+            stripped = line.strip()
+            if stripped.startswith("|"):
+                flush_paragraph()
+                table.append(stripped)
+                continue
+            flush_table()
+            if not stripped:
+                flush_paragraph()
+                continue
+            found = heading(stripped)
+            if found:
+                flush_paragraph()
+                level, title = found
+                while sections and sections[-1][0] >= level:
+                    close_section()
+                sections.append([level, title, False])
+                continue
+            paragraph.append(line.rstrip())
+        flush_paragraph()
+        flush_table()
+        while sections:
+            close_section()
+        return blocks
+
+    def _split_table(self, table):
+        if len(table) <= self.max_table_size:
+            return [table]
+        rows = table.splitlines()
+        header_size = 2 if len(rows) > 1 and TABLE_SEPARATOR.match(rows[1]) else 1
+        header, body = rows[:header_size], rows[header_size:]
+        pieces, current = [], []
+        for row in body:
+            if current and len("\n".join(header + current + [row])) > self.max_table_size:
+                pieces.append("\n".join(header + current))
+                current = []
+            current.append(row)
+        if current:
+            pieces.append("\n".join(header + current))
+        return pieces
+
+    def split_text(self, text):
+        """Returns `(content, section, is_table)` tuples in document order."""
+        chunks = []
+        current, size, current_section = [], 0, None
+
+        def flush():
+            nonlocal current, size
+            if current:
+                chunks.append(("\n\n".join(current), current_section, False))
+            current, size = [], 0
+
+        for kind, body, section in self.blocks(text):
+            if kind == "table":
+                flush()
+                chunks.extend((piece, section, True) for piece in self._split_table(body))
+                continue
+            if section != current_section:
+                flush()
+                current_section = section
+            pieces = [body] if len(body) <= self.chunk_size else self.fallback.split_text(body)
+            for piece in pieces:
+                if current and size + len(piece) > self.chunk_size:
+                    flush()
+                current.append(piece)
+                size += len(piece) + 2
+        flush()
+        return [
+            (f"{section}\n\n{content}" if section else content, section or "", is_table)
+            for content, section, is_table in chunks
+        ]
+
+    def split_documents(self, text, metadata):
+        return [
+            Document(page_content=content, metadata={**metadata, "section": section, "is_table": is_table})
+            for content, section, is_table in self.split_text(text)
+        ]
@@ -0,0 +1,95 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+
+from common import normalize_query
+from observability import metrics
+
+
+class AnswerCache:
+    """Whole-answer cache keyed on question and corpus version; identical in-flight questions share one run."""
+
+    def __init__(self, max_entries=None, ttl=None):
+        self.max_entries = max_entries or int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "256"))
+        self.ttl = ttl if ttl is not None else float(os.getenv("ANSWER_CACHE_TTL", "300"))
+        self.entries = OrderedDict()
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _record(self, result):
+        metrics.inc("rag_answer_cache_requests_total", result=result)
+
+    def get(self, question, version):
+        key = (normalize_query(question), version)
+        with self.lock:
+            if version != self.version:
+                # The corpus changed: answers for the old version can never match again.
+                self.entries.clear()
+                self.version = version
+            entry = self.entries.get(key)
+            if entry is not None and entry["expires_at"] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                self._record("hit")
+                return entry["answer"]
+            if entry is not None:
+                del self.entries[key]
+        return None
+
+    def set(self, question, version, answer, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        with self.lock:
+            if version != self.version:
+                return
+            self.entries[(normalize_query(question), version)] = {"answer": answer, "expires_at": time.monotonic() + ttl}
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    async def get_or_compute(self, question, version, compute, ttl=None):
+        """Returns the cached answer, joins a run in flight, or runs `compute()`; `ttl(answer)` of 0 skips caching."""
+        answer = self.get(question, version)
+        if answer is not None:
+            return answer
+        key = (normalize_query(question), version)
+        task = self.in_flight.get(key)
+        if task is None:
+            with self.lock:
+                self.misses += 1
+            self._record("miss")
+            task = asyncio.ensure_future(compute())
+            self.in_flight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, question, version, done, ttl))
+        else:
+            with self.lock:
+                self.coalesced += 1
+            self._record("coalesced")
+            logging.info(f"Joining in-flight answer for '{key[0]}'.")
+        return await asyncio.shield(task)
+
+    def _finish(self, key, question, version, task, ttl=None):
+        self.in_flight.pop(key, None)
+        if not task.cancelled() and task.exception() is None:
+            answer = task.result()
+            self.set(question, version, answer, ttl(answer) if ttl is not None else None)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+                "entries": len(self.entries),
+                "in_flight": len(self.in_flight),
+                "corpus_version": self.version,
+            }
@@ -1,17 +1,108 @@
+import asyncio
+import logging
+import uuid
 from langchain.agents import create_agent
+from langchain.chat_models import init_chat_model
 from dotenv import load_dotenv
-from rag_pipline.tools import rag_search_tool , web_search_tool
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from rag_pipline.tools import rag_search_tool , web_search_tool, search_internal, aweb_search
+import os
+from rag_pipline.session_store import SessionStore
+from rag_pipline.answer_cache import AnswerCache
+from rag_pipline.router import RetrievalRouter
+from resources import resources
+from common import normalize_query
+from observability import metrics, span, record_message_usage
 load_dotenv()
 
+# "agent" lets the model decide which tools to call; "router" retrieves up front and answers in one model call.
+ORCHESTRATION_MODES = ("agent", "router")
+
+ANSWER_PROMPT = """
+You are **Bajaj Finserv’s Intelligent Knowledge Assistant (B-Fin AI)**. Answer the `**Current user query**` from the
+`**Retrieved context**` that follows it. `[rag_search_tool]` sections come from Bajaj Finserv’s internal documentation
+and take priority; `[web_search_tool]` sections, when present, are public web results, to be used only to fill factual
+gaps or confirm recent changes. Use the `**Chat history**` and any `**Retrieved context from earlier turns**` to
+understand follow-up questions.
+
+* Ground every statement in the provided context; never hallucinate, assume, or speculate. If the context does not
+  answer the query, say so gracefully and recommend https://www.bajajfinserv.in or customer support.
+* Be clear, factual, and structured: **bold** key terms, and use bullets or headers when several aspects are covered.
+* Keep the tone professional, concise, and courteous, like a trained Bajaj Finserv advisor.
+* Do not include raw retrieval text or JSON. Phrase sources implicitly (“As per Bajaj Finserv’s documentation…”,
+  “According to recent updates…”).
+* Prioritize **Accuracy > Completeness > Verbosity**.
+"""
+
+
+def message_text(content):
+    """Flattens message content, which Gemini may return as a list of parts, into plain text."""
+    if isinstance(content, list):
+        return "".join(part["text"] for part in content if isinstance(part, dict) and "text" in part)
+    return str(content)
+
+
+def tool_results(messages):
+    """Pairs each ToolMessage with the query its tool was called with, as `(tool, query, content)`."""
+    queries = {}
+    for msg in messages:
+        if isinstance(msg, AIMessage):
+            for call in msg.tool_calls:
+                queries[call["id"]] = call["args"].get("query", "")
+    return [
+        (msg.name, queries.get(msg.tool_call_id, ""), message_text(msg.content))
+        for msg in messages if isinstance(msg, ToolMessage)
+    ]
+
+
+def web_context(search_results):
+    """Condenses a Tavily response to its answer and the result snippets."""
+    lines = [search_results.get("answer") or ""]
+    lines.extend(
+        f"- {result.get('title')} ({result.get('url')}): {result.get('content')}"
+        for result in search_results.get("results") or []
+    )
+    return "\n".join(line for line in lines if line)
+
+
+def final_answer(messages):
+    for msg in reversed(messages):
+        if isinstance(msg, AIMessage) and not msg.tool_calls:
+            return message_text(msg.content)
+    return ""
+
 
 class GoogleAgent:
-    def __init__(self,):
+    def __init__(self, model="google_genai:gemini-2.5-flash", sessions=None, answer_cache=None, orchestration=None, router=None, web_timeout=None):
+        # `model` is a provider:model string or a chat model instance.
+        self.model = model
         self.agent = None
+        self.chat_model = None
+        self.orchestration = (orchestration or os.getenv("ORCHESTRATION_MODE", "agent")).lower()
+        if self.orchestration not in ORCHESTRATION_MODES:
+            raise ValueError(f"Unsupported orchestration mode: {self.orchestration}")
+        self.router = router or RetrievalRouter()
+        # Seconds the web leg may take before the answer is generated without it.
+        self.web_timeout = web_timeout if web_timeout is not None else float(os.getenv("WEB_SEARCH_TIMEOUT", "4"))
+        # Conversation state for requests that carry a session ID.
+        self.sessions = sessions or SessionStore()
+        if answer_cache is None and os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true":
+            answer_cache = AnswerCache()
+        # Pass answer_cache=False to disable it regardless of the environment.
+        self.answer_cache = answer_cache or None
+        # Answers that used web results go stale with the web; 0 leaves them uncached.
+        self.web_answer_ttl = float(os.getenv("ANSWER_CACHE_WEB_TTL", "0"))
         
+    def get_chat_model(self):
+        """The bare chat model, used for the single generation call in router mode."""
+        if self.chat_model is None:
+            self.chat_model = init_chat_model(self.model) if isinstance(self.model, str) else self.model
+        return self.chat_model
+
     def get_agent(self):
         if self.agent is None:
             self.agent = create_agent(
-                "google_genai:gemini-2.5-flash",
+                self.model,
                 tools=[rag_search_tool,web_search_tool],
                 system_prompt="""
                     ---
@@ -23,9 +114,10 @@ class GoogleAgent:
                     when necessary, external web sources.
                     ---
                     ## **Query Structure**
-                    The user's input will be a formatted string containing two parts:
+                    The user's input will be a formatted string containing two or three parts:
                     1.  `**Current user query**`: This is the user's most recent question that you must answer.
-                    2.  `**Chat history**`: This provides the last few turns of the conversation for context. Use this history to understand the user's intent, maintain conversational flow, and avoid repeating information.
+                    2.  `**Chat history**`: This provides the last few turns of the conversation for context, possibly preceded by a summary of earlier turns. Use this history to understand the user's intent, maintain conversational flow, and avoid repeating information.
+                    3.  `**Retrieved context from earlier turns**` (optional): results of tool calls made earlier in this conversation. If it already answers the current query, answer from it instead of calling the tools again.
 
                     **Your primary goal is to answer the `Current user query`**, using the `Chat history` as a reference to inform your response.
                     ---
@@ -46,7 +138,7 @@ class GoogleAgent:
                     * Reformulate ambiguous or multi-part queries into retrieval-optimized phrasing.
                     ---
                     ### **Step 2 – Internal Search (RAG First)**
-                    * Always call `rag_search_tool(query)` **before any web lookup**.
+                    * Always call `rag_search_tool(query)` **before any web lookup**, unless the retrieved context from earlier turns already covers the query.
                     * Evaluate:
                     * 1) Relevance
                     * 2) Completeness
@@ -137,7 +229,197 @@ class GoogleAgent:
                     """   )
         return self.agent
     
-    def query(self, query: str):
-        
+    def _agent_input(self, query, session_id):
+        """Without a session the query is sent as is; with one it is wrapped with the session's history and context."""
+        content = query if session_id is None else self._render_prompt(session_id, query)
+        return {"messages": [{"role": "user", "content": content}]}
+
+    def _render_prompt(self, session_id, query):
+        return self.sessions.render_prompt(self.sessions.get(session_id), query, resources.doc_processor.corpus_version)
+
+    def _record_turn(self, session_id, query, messages, corpus_version):
+        # Results are tagged with the corpus version from before the turn ran, so an upload during it marks them stale.
+        if session_id is not None:
+            self.sessions.record_turn(session_id, query, final_answer(messages), tool_results(messages), corpus_version)
+
+    def query(self, query: str, session_id=None):
+        corpus_version = resources.doc_processor.corpus_version
+        if self.orchestration == "router":
+            # Router mode is asynchronous; this runs it on a private event loop, so call aquery() from async code.
+            response = asyncio.run(self._ainvoke(query, session_id))
+        else:
+            agent = self.get_agent()
+            with span("agent"):
+                response = agent.invoke(self._agent_input(query, session_id))
+            record_message_usage(response.get("messages", []))
+        self._record_turn(session_id, query, response.get("messages", []), corpus_version)
+        return response
+
+    async def aquery(self, query: str, session_id=None, use_cache=True):
+        """Answers `query`; answers that do not depend on session history go through the answer cache."""
+        corpus_version = resources.doc_processor.corpus_version
+        if self.answer_cache is not None and use_cache and await asyncio.to_thread(self._is_stateless, session_id):
+            response = await self.answer_cache.get_or_compute(
+                query, corpus_version, lambda: self._ainvoke(query, None), ttl=self._answer_ttl
+            )
+        else:
+            response = await self._ainvoke(query, session_id)
+        await asyncio.to_thread(self._record_turn, session_id, query, response.get("messages", []), corpus_version)
+        return response
+
+    def _answer_ttl(self, response):
+        """Cache lifetime for an answer: the default, unless it was built from web search results."""
+        if any(tool == "web_search_tool" for tool, _, _ in tool_results(response.get("messages", []))):
+            return self.web_answer_ttl
+        return None
+
+    def _is_stateless(self, session_id):
+        if session_id is None:
+            return True
+        session = self.sessions.get(session_id)
+        return not session["turns"] and not session["summary"]
+
+    async def _ainvoke(self, query, session_id):
+        if self.orchestration == "router":
+            with span("agent", orchestration="router"):
+                return await self._orchestrate(query, session_id)
         agent = self.get_agent()
-        return agent.invoke({"messages": [{"role": "user", "content": query}]})
\ No newline at end of file
+        with span("agent"):
+            response = await agent.ainvoke(await asyncio.to_thread(self._agent_input, query, session_id))
+        record_message_usage(response.get("messages", []))
+        return response
+
+    def _session_results(self, session_id, query):
+        """Results an earlier turn of the session retrieved for this same query from the current corpus, by tool."""
+        if session_id is None:
+            return {}
+        key = normalize_query(query)
+        corpus_version = resources.doc_processor.corpus_version
+        return {
+            result["tool"]: result["content"]
+            for result in self.sessions.get(session_id)["tool_results"]
+            if result["key"] == f"{result['tool']}:{key}" and result.get("corpus_version") == corpus_version
+        }
+
+    async def _retrieve(self, query, session_id=None):
+        """Routes `query` and runs its searches concurrently, reusing results the session already holds."""
+        stored = await asyncio.to_thread(self._session_results, session_id, query)
+        if "rag_search_tool" in stored:
+            decision, embedding = {"web": "web_search_tool" in stored, "reason": "session context", "similarity": None}, None
+            metrics.inc("rag_router_decisions_total", web=str(decision["web"]).lower(), reason=decision["reason"])
+        else:
+            decision, embedding = await asyncio.to_thread(self.router.route, query)
+        tools = ["rag_search_tool", "web_search_tool"] if decision["web"] else ["rag_search_tool"]
+        searches = {
+            "rag_search_tool": lambda: asyncio.to_thread(search_internal, query, None, embedding),
+            "web_search_tool": lambda: asyncio.wait_for(aweb_search(query), self.web_timeout),
+        }
+        pending = [tool for tool in tools if tool not in stored]
+        outcomes = dict(zip(pending, await asyncio.gather(*(searches[tool]() for tool in pending), return_exceptions=True)))
+        outcomes.update((tool, stored[tool]) for tool in tools if tool in stored)
+        calls, results = [], []
+        for tool in tools:
+            outcome = outcomes[tool]
+            if isinstance(outcome, asyncio.TimeoutError):
+                logging.warning(f"Web search took longer than {self.web_timeout}s, answering without it.")
+                metrics.inc("rag_web_search_timeouts_total")
+                continue
+            if isinstance(outcome, Exception):
+                logging.error(f"{tool} failed, answering without it: {outcome}")
+                continue
+            call_id = f"{tool}-{uuid.uuid4().hex[:12]}"
+            calls.append({"id": call_id, "name": tool, "args": {"query": query}, "type": "tool_call"})
+            content = outcome if isinstance(outcome, str) else web_context(outcome)
+            results.append(ToolMessage(content=content, tool_call_id=call_id, name=tool))
+        messages = [HumanMessage(content=query)]
+        if calls:
+            messages.append(AIMessage(content="", tool_calls=calls))
+            messages.extend(results)
+        return decision, messages
+
+    def _generation_messages(self, query, session_id, messages):
+        """The single prompt of router mode: the query with its session context, followed by everything retrieved."""
+        prompt = f"**Current user query**:{query}" if session_id is None else self._render_prompt(session_id, query)
+        context = "\n\n".join(f"[{msg.name}]\n{message_text(msg.content)}" for msg in messages if isinstance(msg, ToolMessage))
+        return [
+            SystemMessage(content=ANSWER_PROMPT),
+            HumanMessage(content=f"{prompt}\n**Retrieved context**:\n{context or '(nothing was retrieved)'}"),
+        ]
+
+    async def _orchestrate(self, query, session_id):
+        """Router mode: retrieval, then a single generation call."""
+        decision, messages = await self._retrieve(query, session_id)
+        generation_messages = await asyncio.to_thread(self._generation_messages, query, session_id, messages)
+        with span("generate"):
+            answer = await self.get_chat_model().ainvoke(generation_messages)
+        record_message_usage([answer])
+        return {"messages": messages + [answer], "route": decision}
+
+    async def astream(self, query: str, session_id=None):
+        """Yields `token`, `tool_call` and `tool_result` events as the agent runs, then records the turn."""
+        messages = []
+        corpus_version = resources.doc_processor.corpus_version
+        if self.orchestration == "router":
+            events = self._stream_orchestrated(query, session_id, messages)
+        else:
+            stream = self.get_agent().astream(
+                await asyncio.to_thread(self._agent_input, query, session_id),
+                stream_mode=["messages", "updates"],
+            )
+            events = self._stream_events(stream, messages)
+        with span("agent", streaming=True, orchestration=self.orchestration):
+            async for event in events:
+                yield event
+        await asyncio.to_thread(self._record_turn, session_id, query, messages, corpus_version)
+
+    async def _stream_orchestrated(self, query, session_id, messages):
+        """Router mode as a stream: the retrieval events, then the answer token by token."""
+        _, retrieval = await self._retrieve(query, session_id)
+        messages.extend(retrieval)
+        for msg in retrieval:
+            for event in self._message_events(msg):
+                yield event
+        generation_messages = await asyncio.to_thread(self._generation_messages, query, session_id, retrieval)
+        answer = None
+        with span("generate", streaming=True):
+            async for chunk in self.get_chat_model().astream(generation_messages):
+                text = message_text(chunk.content)
+                if text:
+                    yield {"event": "token", "data": text}
+                answer = chunk if answer is None else answer + chunk
+        if answer is not None:
+            record_message_usage([answer])
+            messages.append(answer)
+
+    @staticmethod
+    def _message_events(msg):
+        if isinstance(msg, AIMessage) and msg.tool_calls:
+            yield {
+                "event": "tool_call",
+                "data": [{"id": call["id"], "name": call["name"], "args": call["args"]} for call in msg.tool_calls],
+            }
+        elif isinstance(msg, ToolMessage):
+            yield {
+                "event": "tool_result",
+                "data": {"tool_call_id": msg.tool_call_id, "name": msg.name, "content": message_text(msg.content)},
+            }
+
+    async def _stream_events(self, stream, messages):
+        """Translates raw agent stream output into events, collecting finished messages into `messages`."""
+        async for mode, data in stream:
+            if mode == "messages":
+                # Streamed chunks arrive as AIMessageChunk; a model that does not
+                # stream yields its whole AIMessage here once instead.
+                chunk, _ = data
+                if isinstance(chunk, AIMessage):
+                    text = message_text(chunk.content)
+                    if text:
+                        yield {"event": "token", "data": text}
+                continue
+            for update in data.values():
+                update_messages = (update or {}).get("messages", [])
+                record_message_usage(update_messages)
+                messages.extend(update_messages)
+                for msg in update_messages:
+                    for event in self._message_events(msg):
+                        yield event
\ No newline at end of file
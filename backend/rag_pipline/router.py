@@ -0,0 +1,73 @@
+import os
+import re
+import logging
+from datetime import date
+
+from resources import resources
+from observability import metrics
+
+WEB_POLICIES = ("auto", "always", "never")
+
+# Phrases that ask for information newer than the ingested documents. Words that are also
+# factsheet vocabulary ("current ratio", "live schemes", "recent performance") are left out.
+DEFAULT_WEB_KEYWORDS = (
+    "latest", "today", "today's", "yesterday", "news", "right now", "as of now", "this week", "this month",
+    "share price", "stock price", "market price", "breaking",
+)
+
+
+class RetrievalRouter:
+    """Decides, before any model call, whether a question needs a web search on top of the documents."""
+
+    def __init__(self, policy=None, min_similarity=None, keywords=None):
+        self.policy = (policy or os.getenv("WEB_SEARCH_POLICY", "auto")).lower()
+        if self.policy not in WEB_POLICIES:
+            raise ValueError(f"Unsupported web search policy: {self.policy}")
+        self.min_similarity = min_similarity if min_similarity is not None else float(os.getenv("ROUTER_MIN_SIMILARITY", "0.6"))
+        if keywords is None:
+            configured = os.getenv("WEB_SEARCH_KEYWORDS", "")
+            keywords = [keyword.strip() for keyword in configured.split(",") if keyword.strip()] or DEFAULT_WEB_KEYWORDS
+        # Whole words only, with any run of whitespace between the words of a phrase.
+        phrases = (r"\s+".join(re.escape(word) for word in keyword.lower().split()) for keyword in keywords)
+        self.keyword_pattern = re.compile(r"(?<![\w'])(" + "|".join(phrases) + r")(?![\w'])")
+
+    def _web_keyword(self, query):
+        match = self.keyword_pattern.search(query.lower())
+        return match.group(1) if match else None
+
+    @staticmethod
+    def _current_year(query):
+        years = [int(year) for year in re.findall(r"\b(20\d\d)\b", query)]
+        return max(years) if years and max(years) >= date.today().year else None
+
+    def route(self, query):
+        """Returns the decision and the query embedding, if one was computed, for the search to reuse."""
+        decision, embedding = self._route(query)
+        year = self._current_year(query)
+        if year is not None:
+            decision["year"] = year
+        metrics.inc("rag_router_decisions_total", web=str(decision["web"]).lower(), reason=decision["reason"])
+        logging.info(f"Router: web={decision['web']} ({decision['reason']}, similarity={decision['similarity']})")
+        return decision, embedding
+
+    def _route(self, query):
+        if self.policy != "auto":
+            return {"web": self.policy == "always", "reason": "policy", "similarity": None}, None
+        keyword = self._web_keyword(query)
+        if keyword:
+            return {"web": True, "reason": "web keyword", "keyword": keyword, "similarity": None}, None
+        doc_processor = resources.doc_processor
+        try:
+            if doc_processor.sparse_confident(query):
+                return {"web": False, "reason": "sparse match", "similarity": None}, None
+            embedding = doc_processor.query_embedding(query)
+            similarity = doc_processor.corpus_similarity(query, embedding)
+        except Exception as e:
+            logging.warning(f"Corpus similarity check failed, searching the web as well: {e}")
+            return {"web": True, "reason": "similarity unavailable", "similarity": None}, None
+        if similarity is None:
+            return {"web": True, "reason": "empty corpus", "similarity": None}, embedding
+        similarity = round(similarity, 3)
+        if similarity >= self.min_similarity:
+            return {"web": False, "reason": "corpus match", "similarity": similarity}, embedding
+        return {"web": True, "reason": "low corpus similarity", "similarity": similarity}, embedding
@@ -0,0 +1,208 @@
+import os
+import re
+import copy
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+from common import connect_sqlite, normalize_query
+
+# Tools whose results are kept per session and offered back to the agent on later turns.
+CACHED_TOOLS = ("rag_search_tool", "web_search_tool")
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token); good enough for budgeting prompts."""
+    return len(text) // 4 + 1
+
+
+def extractive_summary(previous_summary, turns, max_chars):
+    """Folds turns into the running summary as question and first answer sentence, within `max_chars`."""
+    lines = [line for line in previous_summary.splitlines() if line.strip()]
+    for turn in turns:
+        answer = re.split(r"(?<=[.!?])\s", turn["assistant"].strip(), maxsplit=1)[0]
+        lines.append(f"- User asked: {turn['user'].strip()} | Answer: {answer}")
+    while len(lines) > 1 and len("\n".join(lines)) > max_chars:
+        lines.pop(0)
+    return "\n".join(lines)[-max_chars:]
+
+
+class ModelSummarizer:
+    """Summarizes evicted turns with a chat model; used when SESSION_SUMMARY_MODE=model."""
+
+    def __init__(self, model=None, max_chars=1200):
+        if model is None or isinstance(model, str):
+            from langchain.chat_models import init_chat_model
+            model = init_chat_model(model or os.getenv("SESSION_SUMMARY_MODEL", "google_genai:gemini-2.0-flash-lite"))
+        self.model = model
+        self.max_chars = max_chars
+
+    def __call__(self, previous_summary, turns):
+        transcript = "\n".join(f"User: {turn['user']}\nAI: {turn['assistant']}" for turn in turns)
+        prompt = (
+            f"Update the running summary of a conversation with a financial assistant. "
+            f"Keep product names, figures and open questions; stay under {self.max_chars} characters.\n\n"
+            f"Current summary:\n{previous_summary or '(empty)'}\n\nNew turns:\n{transcript}\n\nUpdated summary:"
+        )
+        try:
+            content = self.model.invoke(prompt).content
+            if isinstance(content, list):
+                content = "".join(part.get("text", "") for part in content if isinstance(part, dict))
+            return content.strip()[:self.max_chars]
+        except Exception as e:
+            logging.error(f"Session summary failed, falling back to the extractive summary: {e}")
+            return extractive_summary(previous_summary, turns, self.max_chars)
+
+
+class SessionStore:
+    """Per-session turns, rolling summary and tool results, in an LRU optionally written through to SQLite."""
+
+    def __init__(self, path=None, max_sessions=None, ttl=None, history_tokens=None, context_tokens=None, max_tool_results=None, summarizer=None):
+        self.path = path if path is not None else os.getenv("SESSION_STORE_PATH", "")
+        self.max_sessions = max_sessions or int(os.getenv("SESSION_MAX_SESSIONS", "1000"))
+        self.ttl = ttl if ttl is not None else float(os.getenv("SESSION_TTL", "86400"))
+        self.history_tokens = history_tokens or int(os.getenv("SESSION_HISTORY_TOKENS", "1500"))
+        self.context_tokens = context_tokens or int(os.getenv("SESSION_CONTEXT_TOKENS", "1500"))
+        self.max_tool_results = max_tool_results or int(os.getenv("SESSION_MAX_TOOL_RESULTS", "4"))
+        summary_chars = int(os.getenv("SESSION_SUMMARY_CHARS", "1200"))
+        if summarizer is None:
+            if os.getenv("SESSION_SUMMARY_MODE", "extractive").lower() == "model":
+                summarizer = ModelSummarizer(max_chars=summary_chars)
+            else:
+                summarizer = lambda previous_summary, turns: extractive_summary(previous_summary, turns, summary_chars)
+        self.summarizer = summarizer
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+        self.conn = None
+        if self.path:
+            self.conn = connect_sqlite(self.path)
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL, version INTEGER NOT NULL DEFAULT 0)"
+            )
+            # Stores created before turns were versioned lack the column.
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(sessions)")}
+            if "version" not in columns:
+                self.conn.execute("ALTER TABLE sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            self.conn.commit()
+
+    @staticmethod
+    def _new_session(version=0):
+        return {"turns": [], "summary": "", "tool_results": [], "updated_at": time.time(), "version": version}
+
+    def _expired(self, session):
+        return self.ttl and time.time() - session["updated_at"] > self.ttl
+
+    def get(self, session_id):
+        """Returns the session, or a new empty one if it does not exist or has expired."""
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if self.conn is not None:
+                # Another worker may have written the session since it was cached here.
+                row = self.conn.execute("SELECT version FROM sessions WHERE id = ?", (session_id,)).fetchone()
+                if row is not None and (session is None or row[0] != session.get("version", 0)):
+                    row = self.conn.execute("SELECT data FROM sessions WHERE id = ?", (session_id,)).fetchone()
+                    session = json.loads(row[0])
+            if session is None:
+                return self._new_session()
+            if self._expired(session):
+                # Keeps the version, so the next turn replaces the expired session.
+                return self._new_session(session.get("version", 0))
+            self.sessions[session_id] = session
+            self.sessions.move_to_end(session_id)
+            self._evict()
+            return session
+
+    def _evict(self):
+        while len(self.sessions) > self.max_sessions:
+            self.sessions.popitem(last=False)
+
+    def _save(self, session_id, session, expected_version):
+        """Writes the session unless its version moved past `expected_version`; returns whether it was written."""
+        session["updated_at"] = time.time()
+        session["version"] = expected_version + 1
+        with self.lock:
+            if self.conn is None:
+                cached = self.sessions.get(session_id)
+                if cached is not None and cached.get("version", 0) != expected_version:
+                    return False
+            else:
+                self.conn.execute("BEGIN IMMEDIATE")
+                try:
+                    row = self.conn.execute("SELECT version FROM sessions WHERE id = ?", (session_id,)).fetchone()
+                    if (row[0] if row else 0) != expected_version:
+                        self.conn.rollback()
+                        return False
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO sessions (id, data, updated_at, version) VALUES (?, ?, ?, ?)",
+                        (session_id, json.dumps(session), session["updated_at"], session["version"]),
+                    )
+                    self.conn.commit()
+                except Exception:
+                    self.conn.rollback()
+                    raise
+            self.sessions[session_id] = session
+            self.sessions.move_to_end(session_id)
+            self._evict()
+        return True
+
+    def delete(self, session_id):
+        with self.lock:
+            existed = self.sessions.pop(session_id, None) is not None
+            if self.conn is not None:
+                existed = self.conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,)).rowcount > 0 or existed
+                self.conn.commit()
+        return existed
+
+    def render_prompt(self, session, query, corpus_version=None):
+        """Renders the query with the session's history and earlier tool results from `corpus_version`, within budget."""
+        history = []
+        if session["summary"]:
+            history.append(f"Summary of earlier conversation:\n{session['summary']}")
+        history.extend(f"User: {turn['user']}\nAI: {turn['assistant']}" for turn in session["turns"])
+        parts = [f"**Current user query**:{query}", "**Chat history**:\n" + "\n".join(history)]
+
+        context, budget = [], self.context_tokens
+        for result in reversed(session["tool_results"]):
+            if budget <= 0:
+                break
+            if corpus_version is not None and result.get("corpus_version") != corpus_version:
+                continue
+            entry = f"[{result['tool']}: {result['query']}]\n{result['content']}"[:budget * 4]
+            context.append(entry)
+            budget -= estimate_tokens(entry)
+        if context:
+            parts.append("**Retrieved context from earlier turns**:\n" + "\n\n".join(context))
+        return "\n".join(parts)
+
+    def record_turn(self, session_id, query, answer, tool_results=(), corpus_version=None):
+        """Appends a turn and its tool results; retried on top of any turn written meanwhile."""
+        while True:
+            session = self._record_turn(session_id, query, answer, tool_results, corpus_version)
+            if session is not None:
+                return session
+            logging.info(f"Session {session_id} changed while recording a turn, retrying.")
+
+    def _record_turn(self, session_id, query, answer, tool_results, corpus_version):
+        # Work on a copy so a concurrent reader never sees a half-updated session.
+        session = copy.deepcopy(self.get(session_id))
+        version = session.get("version", 0)
+        session["turns"].append({"user": query, "assistant": answer})
+        evicted = []
+        while len(session["turns"]) > 1 and sum(
+            estimate_tokens(turn["user"]) + estimate_tokens(turn["assistant"]) for turn in session["turns"]
+        ) > self.history_tokens:
+            evicted.append(session["turns"].pop(0))
+        if evicted:
+            session["summary"] = self.summarizer(session["summary"], evicted)
+
+        results = list(session["tool_results"])
+        for tool, tool_query, content in tool_results:
+            if tool not in CACHED_TOOLS or not content:
+                continue
+            key = f"{tool}:{normalize_query(tool_query)}"
+            results = [result for result in results if result["key"] != key]
+            results.append({"key": key, "tool": tool, "query": tool_query, "content": content, "corpus_version": corpus_version})
+        session["tool_results"] = results[-self.max_tool_results:]
+        return session if self._save(session_id, session, version) else None
@@ -1,19 +1,46 @@
-from langchain.agents import create_agent
-from pipeline_for_docement_ingestion.docsProcessing import DocsProcessor
-import os
-from langchain.tools import tool
-from dotenv import load_dotenv
-from tavily import TavilyClient
-load_dotenv()
-tavily_client = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
-docsProcessor = DocsProcessor()
-@tool("rag_search_tool", description="Useful for answering questions about financial documents based on their content.")   
-def rag_search_tool(query: str) -> str:
-    results = docsProcessor.search_documents(query, k=6)    
+import asyncio
+from typing import Optional
+from langchain_core.tools import StructuredTool
+from resources import resources
+from observability import span
+
+def search_internal(query, filters=None, embedding=None):
+    """The search behind rag_search_tool; router mode calls it directly, passing the embedding it already has."""
+    with span("rag_search_tool"):
+        results = resources.doc_processor.search_documents(query, k=6, filters=filters, embedding=embedding)
     return results
 
-@tool("web_search_tool", description="Useful for answering questions by searching the web for up-to-date information.")   
-def web_search_tool(query: str) -> dict:
-    search_results = tavily_client.search(query=query, include_answer="basic",country="india",max_results=3)
+def rag_search(query: str, filename: Optional[str] = None, page: Optional[int] = None) -> str:
+    return search_internal(query, {"filename": filename, "page": page})
+
+async def arag_search(query: str, filename: Optional[str] = None, page: Optional[int] = None) -> str:
+    # The Qdrant search path is synchronous, so run it in a worker thread.
+    return await asyncio.to_thread(rag_search, query, filename, page)
+
+def web_search(query: str) -> dict:
+    with span("web_search_tool"):
+        search_results = resources.tavily_client.search(query=query, include_answer="basic",country="india",max_results=3)
     return search_results
 
+async def aweb_search(query: str) -> dict:
+    with span("web_search_tool"):
+        search_results = await resources.async_tavily_client.search(query=query, include_answer="basic",country="india",max_results=3)
+    return search_results
+
+# Each tool has a sync and an async implementation so the agent can run under invoke() or ainvoke()/astream().
+rag_search_tool = StructuredTool.from_function(
+    func=rag_search,
+    coroutine=arag_search,
+    name="rag_search_tool",
+    description=(
+        "Useful for answering questions about financial documents based on their content. "
+        "Pass `filename` and/or `page` only when the user names a specific document or page."
+    ),
+)
+
+web_search_tool = StructuredTool.from_function(
+    func=web_search,
+    coroutine=aweb_search,
+    name="web_search_tool",
+    description="Useful for answering questions by searching the web for up-to-date information.",
+)
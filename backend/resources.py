@@ -0,0 +1,69 @@
+import os
+import logging
+import threading
+from dotenv import load_dotenv
+from tavily import TavilyClient, AsyncTavilyClient
+from common import LazyInit
+from pipeline_for_docement_ingestion.docsProcessing import DocsProcessor
+from pipeline_for_docement_ingestion.pageExtractor import PageExtractor
+from pipeline_for_docement_ingestion.ingestionJobs import IngestionJobQueue
+
+load_dotenv()
+
+
+class Resources(LazyInit):
+    """Process-wide clients shared by the API handlers and the agent tools, each created on first access."""
+
+    def __init__(self):
+        self._init_lock = threading.RLock()
+        self._doc_processor = None
+        self._page_extractor = None
+        self._ingestion_jobs = None
+        self._tavily_client = None
+        self._async_tavily_client = None
+        self.init_seconds = {}
+
+    @property
+    def doc_processor(self):
+        return self._lazy("_doc_processor", DocsProcessor)
+
+    @property
+    def page_extractor(self):
+        return self._lazy("_page_extractor", lambda: PageExtractor(self.doc_processor))
+
+    @property
+    def ingestion_jobs(self):
+        return self._lazy("_ingestion_jobs", lambda: IngestionJobQueue(self.doc_processor))
+
+    @property
+    def tavily_client(self):
+        return self._lazy("_tavily_client", lambda: TavilyClient(api_key=os.getenv("TAVILY_API_KEY")))
+
+    @property
+    def async_tavily_client(self):
+        return self._lazy("_async_tavily_client", lambda: AsyncTavilyClient(api_key=os.getenv("TAVILY_API_KEY")))
+
+    def warm_up(self):
+        """Creates every client ahead of the first request; safe to run in a background thread."""
+        logging.info("Warming up shared clients...")
+        try:
+            doc_processor = self.doc_processor
+            doc_processor.model
+            doc_processor.vector_store
+            doc_processor.sparse_index
+            self.tavily_client
+            self.async_tavily_client
+            logging.info("Shared clients ready.")
+        except Exception as e:
+            # Leave the failing client to be retried, and reported, by the first request that needs it.
+            logging.error(f"An error occurred while warming up clients: {e}")
+
+    def init_timings(self):
+        timings = dict(self.init_seconds)
+        if self._doc_processor is not None:
+            for name, seconds in self._doc_processor.init_seconds.items():
+                timings[f"doc_processor.{name}"] = seconds
+        return timings
+
+
+resources = Resources()
@@ -0,0 +1,52 @@
+"""Run from the backend directory: python -m pytest tests"""
+from pipeline_for_docement_ingestion.ingestionJobs import IngestionJobQueue, IngestionJobStore
+
+
+class FakeProcessor:
+    def __init__(self, error=None):
+        self.triaged = []
+        self.error = error
+
+    def triage_pdf(self, file_content, page_numbers):
+        self.triaged.append(page_numbers)
+        if self.error is not None:
+            raise self.error
+        return iter(())
+
+
+def test_cancelled_job_is_not_claimed(tmp_path):
+    store = IngestionJobStore(str(tmp_path / "jobs.sqlite3"))
+    job_id = store.create("a.pdf", b"%PDF", 2)
+    # Cancelled by another process between the job being queued and a worker picking it up.
+    store.set_status(job_id, "cancelled")
+    processor = FakeProcessor()
+    IngestionJobQueue(processor, store=store)._run(job_id)
+    assert store.status(job_id) == "cancelled"
+    assert processor.triaged == []
+
+
+def test_cancel_survives_a_restart(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    store = IngestionJobStore(path)
+    job_id = store.create("a.pdf", b"%PDF", 2)
+    assert IngestionJobQueue(FakeProcessor(), store=store).cancel(job_id) == "cancelled"
+
+    restarted = IngestionJobStore(path)
+    assert restarted.unfinished() == []
+    IngestionJobQueue(FakeProcessor(), store=restarted)._run(job_id)
+    assert restarted.status(job_id) == "cancelled"
+
+
+def test_interrupted_running_job_is_resumed_on_start(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    store = IngestionJobStore(path)
+    job_id = store.create("a.pdf", b"%PDF", 2)
+    assert store.set_status(job_id, "running", expected=("queued",))
+    assert not store.set_status(job_id, "running", expected=("queued",))
+
+    processor = FakeProcessor(error=RuntimeError("boom"))
+    queue = IngestionJobQueue(processor, store=IngestionJobStore(path))
+    queue.start()
+    queue.queue.join()
+    assert processor.triaged == [[1, 2]]
+    assert queue.store.get(job_id)["error"] == "boom"
@@ -0,0 +1,38 @@
+"""Run from the backend directory: python -m pytest tests"""
+from langchain_core.documents import Document
+
+from pipeline_for_docement_ingestion.pageExtractor import PageExtractor
+
+
+class FakeProcessor:
+    def __init__(self, fail_chunks=()):
+        self.indexed = []
+        self.fail_chunks = set(fail_chunks)
+
+    def process_page(self, page, index, metadata):
+        return {"text": f"text of {page}", "summary": "", "metadata": metadata}
+
+    def split_documents(self, text, summary, metadata):
+        return [Document(page_content=f"{text} part {part}", metadata=dict(metadata)) for part in range(2)]
+
+    def index_chunks(self, chunks):
+        failed = [{"chunk": position, "error": "boom"} for position in range(len(chunks)) if position in self.fail_chunks]
+        self.indexed.extend(chunk for position, chunk in enumerate(chunks) if position not in self.fail_chunks)
+        return {"chunks": len(chunks), "indexed": len(chunks) - len(failed), "failed": failed}
+
+
+def test_upload_scope_keeps_non_contiguous_page_numbers():
+    processor = FakeProcessor()
+    extractor = PageExtractor(processor, max_workers=2, batch_scope="upload")
+    extractor.process_pages(["c", "d"], filename="a.pdf", page_numbers=[3, 4])
+    assert [(chunk.metadata["page"], chunk.page_content) for chunk in processor.indexed] == [
+        (3, "text of c part 0"), (3, "text of c part 1"), (4, "text of d part 0"), (4, "text of d part 1"),
+    ]
+
+
+def test_upload_scope_maps_failures_to_their_page():
+    processor = FakeProcessor(fail_chunks={3})
+    extractor = PageExtractor(processor, max_workers=2, batch_scope="upload")
+    results = extractor.process_pages(["c", "d"], filename="a.pdf", page_numbers=[7, 9])
+    assert results[0]["indexing"] == {"chunks": 2, "indexed": 2, "failed": []}
+    assert results[1]["indexing"] == {"chunks": 2, "indexed": 1, "failed": [{"chunk": 1, "error": "boom"}]}
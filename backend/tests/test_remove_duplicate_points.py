@@ -0,0 +1,50 @@
+"""Run from the backend directory: python -m pytest tests"""
+import uuid
+
+from qdrant_client.models import PointStruct
+
+from benchmarks.stubs import build_processor
+
+
+def copy_point(processor, record, metadata):
+    """Writes the record's text again under a new random ID, as ingestion did before stable point IDs."""
+    payload = {**record.payload, processor.vector_store.metadata_payload_key: metadata}
+    processor.client.upsert(processor.collection_name, [PointStruct(id=str(uuid.uuid4()), vector=record.vector, payload=payload)])
+
+
+def points(processor):
+    records, _ = processor.client.scroll(processor.collection_name, limit=100, with_payload=True, with_vectors=True)
+    return records
+
+
+def test_legacy_point_without_source_is_removed_when_the_text_is_indexed_with_one():
+    processor = build_processor()
+    processor.add_documents("Expense ratio is 0.65 percent.", "Factsheet", {"filename": "a.pdf", "page": 1})
+    [record] = points(processor)
+    copy_point(processor, record, {"summary": "Factsheet"})
+
+    assert processor.remove_duplicate_points() == 1
+    [kept] = points(processor)
+    assert kept.id == record.id
+    assert kept.payload[processor.vector_store.metadata_payload_key]["filename"] == "a.pdf"
+
+
+def test_legacy_points_alone_keep_one_copy():
+    processor = build_processor()
+    processor.add_documents("Expense ratio is 0.65 percent.", "Factsheet", {"filename": "a.pdf", "page": 1})
+    [record] = points(processor)
+    copy_point(processor, record, {"summary": "Factsheet"})
+    copy_point(processor, record, {"summary": "Factsheet"})
+    processor.client.delete(processor.collection_name, points_selector=[record.id], wait=True)
+
+    assert processor.remove_duplicate_points() == 1
+    assert len(points(processor)) == 1
+
+
+def test_same_text_on_different_pages_is_kept():
+    processor = build_processor()
+    processor.add_documents("Expense ratio is 0.65 percent.", "Factsheet", {"filename": "a.pdf", "page": 1})
+    processor.add_documents("Expense ratio is 0.65 percent.", "Factsheet", {"filename": "a.pdf", "page": 2})
+
+    assert processor.remove_duplicate_points() == 0
+    assert len(points(processor)) == 2
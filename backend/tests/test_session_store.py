@@ -0,0 +1,81 @@
+"""Run from the backend directory: python -m pytest tests"""
+import threading
+
+import pytest
+
+from rag_pipline.session_store import SessionStore, extractive_summary
+
+
+def recorded_questions(session):
+    return session["summary"].count("User asked") + len(session["turns"])
+
+
+@pytest.mark.parametrize("sqlite", [False, True])
+def test_concurrent_turns_are_all_kept(tmp_path, sqlite):
+    path = str(tmp_path / "sessions.sqlite3") if sqlite else ""
+    stores = [SessionStore(path=path, history_tokens=20), SessionStore(path=path, history_tokens=20)] if sqlite else [SessionStore(path="", history_tokens=20)]
+    threads = [
+        threading.Thread(target=stores[index % len(stores)].record_turn, args=("s", f"question {index}", f"answer {index}."))
+        for index in range(20)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert recorded_questions(stores[0].get("s")) == 20
+
+
+def test_summarizer_runs_without_the_store_lock():
+    started, release = threading.Event(), threading.Event()
+
+    def slow_summarizer(previous_summary, turns):
+        started.set()
+        release.wait(5)
+        return extractive_summary(previous_summary, turns, 1200)
+
+    store = SessionStore(path="", history_tokens=10, summarizer=slow_summarizer)
+    store.record_turn("a", "first question " * 5, "first answer.")
+    writer = threading.Thread(target=store.record_turn, args=("a", "second question " * 5, "second answer."))
+    writer.start()
+    assert started.wait(5)
+    # Other sessions stay usable while the summary is being written.
+    reader = threading.Thread(target=store.record_turn, args=("b", "question", "answer."))
+    reader.start()
+    reader.join(1)
+    finished = not reader.is_alive()
+    release.set()
+    reader.join()
+    assert finished
+    assert store.get("b")["turns"] == [{"user": "question", "assistant": "answer."}]
+    writer.join()
+    assert recorded_questions(store.get("a")) == 2
+
+
+def test_turn_written_during_a_summary_is_not_lost(tmp_path):
+    path = str(tmp_path / "sessions.sqlite3")
+    other = SessionStore(path=path)
+    calls = []
+
+    def interleaving_summarizer(previous_summary, turns):
+        if not calls:
+            # Another worker records a turn while this one is summarizing.
+            other.record_turn("s", "concurrent question", "concurrent answer.")
+        calls.append(turns)
+        return extractive_summary(previous_summary, turns, 1200)
+
+    store = SessionStore(path=path, history_tokens=10, summarizer=interleaving_summarizer)
+    store.record_turn("s", "first question " * 5, "first answer.")
+    store.record_turn("s", "second question " * 5, "second answer.")
+    session = SessionStore(path=path).get("s")
+    assert recorded_questions(session) == 3
+    assert "concurrent question" in session["summary"] + str(session["turns"])
+
+
+def test_results_from_another_corpus_version_are_left_out_of_the_prompt():
+    store = SessionStore(path="")
+    store.record_turn("s", "old question", "old answer.", [("rag_search_tool", "old question", "old context")], corpus_version=1)
+    store.record_turn("s", "new question", "new answer.", [("rag_search_tool", "new question", "new context")], corpus_version=2)
+    prompt = store.render_prompt(store.get("s"), "next question", corpus_version=2)
+    assert "new context" in prompt
+    assert "old context" not in prompt
+    assert "old context" in store.render_prompt(store.get("s"), "next question")
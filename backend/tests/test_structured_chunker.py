@@ -0,0 +1,66 @@
+"""Run from the backend directory: python -m pytest tests"""
+import random
+import re
+
+import pytest
+
+from pipeline_for_docement_ingestion.structuredChunker import StructuredChunker, heading
+
+
+def words(text):
+    return re.findall(r"[\w.%₹$]+", text)
+
+
+def assert_nothing_lost(text, chunker):
+    output = " ".join(content for content, _, _ in chunker.split_text(text))
+    missing = [word for word in words(text) if word not in output]
+    assert not missing, f"missing from the chunks: {missing}"
+
+
+FACTSHEET_PAGES = [
+    "FUND MANAGER: RAHUL SHARMA\nEXPENSE RATIO: 0.65%\nBENCHMARK: NIFTY 50 TRI\nThe fund invests in large caps.",
+    "# Fund\n\nBody text.\n\n## Risk\n### Note",
+    "PORTFOLIO HOLDINGS\n\n| Holding | Weight |\n| --- | --- |\n| Infosys | 6.10% |\n| TCS | 4.05% |\n\nNAV ₹ 112.40",
+    "**Investment Objective**\n**Fund Details**\nAUM: Rs. 1,204 crore\n\n## Empty\n## Also empty\nTrailing line.",
+    "TOTAL ₹ 1,200\nNET ASSETS $ 50\nRISKOMETER\n\nVery high risk.",
+]
+
+
+@pytest.mark.parametrize("text", FACTSHEET_PAGES)
+def test_no_input_text_is_lost(text):
+    assert_nothing_lost(text, StructuredChunker(chunk_size=1000, chunk_overlap=100))
+
+
+def test_no_input_text_is_lost_on_generated_pages():
+    rng = random.Random(0)
+    line_kinds = [
+        lambda n: f"# Section {n}",
+        lambda n: f"### SUBSECTION {chr(65 + n % 26)}",
+        lambda n: f"**Label {n}**",
+        lambda n: f"SCHEME {n}: VALUE {n * 1.5:.2f}%",
+        lambda n: "PORTFOLIO HOLDINGS",
+        lambda n: f"| Row {n} | {n * 0.7:.2f}% |",
+        lambda n: f"Paragraph {n} " + "with filler words " * rng.randint(1, 120),
+        lambda n: "",
+    ]
+    for _ in range(200):
+        text = "\n".join(rng.choice(line_kinds)(n) for n in range(rng.randint(1, 40)))
+        assert_nothing_lost(text, StructuredChunker(chunk_size=rng.choice([200, 500, 1000]), chunk_overlap=50))
+
+
+@pytest.mark.parametrize("line", ["EXPENSE RATIO: 0.65%", "NIFTY 50 TRI", "TOTAL ₹ 1,200", "AUM RS. 500 CRORE"])
+def test_caps_lines_with_figures_are_not_headings(line):
+    assert heading(line) is None
+
+
+def test_caps_titles_are_headings():
+    assert heading("PORTFOLIO HOLDINGS") == (2, "PORTFOLIO HOLDINGS")
+
+
+def test_tables_stay_whole_and_carry_their_section():
+    text = "## Performance\n| Period | Return |\n| --- | --- |\n| 1 Year | 14.2% |\n| 3 Years | 11.0% |"
+    chunks = StructuredChunker(chunk_size=1000).split_text(text)
+    tables = [chunk for chunk in chunks if chunk[2]]
+    assert len(tables) == 1
+    assert tables[0][1] == "Performance"
+    assert "| 3 Years | 11.0% |" in tables[0][0]
@@ -161,6 +161,7 @@ export default function Home() {
   const [modalContent, setModalContent] = useState<BackendMessage[] | null>(null);
   const messagesEndRef = useRef<HTMLDivElement>(null);
   const inputRef = useRef<HTMLInputElement>(null);
+  const sessionId = useRef(uuidv4());
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
@@ -185,17 +186,11 @@ export default function Home() {
     setIsTyping(true);
 
     try {
-      const history = messages.slice(-6);
-      const chatHistory = history
-        .map((msg) => `${msg.sender === "user" ? "User" : "AI"}: ${msg.text}`)
-        .join("\n");
-
-      const query = `**Current user query**:${input}\n**Chat history**:\n${chatHistory}`;
-
+      // History is kept server-side under the session ID, so only the new message is sent.
       const response = await fetch("/api/chat", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ question: query }),
+        body: JSON.stringify({ question: input, session_id: sessionId.current }),
       });
 
       const data = await response.json();
@@ -46,9 +46,27 @@ export const UploadProvider = ({ children }: { children: ReactNode }) => {
     try {
       const response = await fetch(url, { method: "POST", body: formData });
       if (!response.ok) throw new Error('Upload failed');
-      
+
+      // PDFs are ingested in the background; poll the job until it finishes.
+      const data = await response.json();
+      let message = 'File uploaded successfully!';
+      if (data.job_id) {
+        let job = data;
+        while (job.status === 'queued' || job.status === 'running') {
+          await new Promise((resolve) => setTimeout(resolve, 2000));
+          const jobResponse = await fetch(`/api/jobs/${data.job_id}`);
+          if (!jobResponse.ok) throw new Error('Job status check failed');
+          job = await jobResponse.json();
+        }
+        if (job.status === 'completed_with_errors') {
+          message = `File uploaded, but ${job.error}`;
+        } else if (job.status !== 'completed') {
+          throw new Error(`Ingestion ${job.status}`);
+        }
+      }
+
       setUploadStatus('success');
-      setNotification({ message: 'File uploaded successfully!', type: 'success' });
+      setNotification({ message, type: 'success' });
     } catch (error) {
       console.error("Error uploading file:", error);
       setUploadStatus('error');